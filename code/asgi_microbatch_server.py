@@ -0,0 +1,131 @@
+# async serving mode for the prediction server
+# single row /predict requests that arrive together are coalesced into one vectorized model call
+# (microbatcher.py), trading up to MICROBATCH_MAX_WAIT_US microseconds of latency for much
+# higher sustained qps. /predict/batch and /metrics behave like the flask server.
+# the model, hot reload and cache come from the flask server module, only the http layer differs
+#
+# run with: uvicorn asgi_microbatch_server:app --host 0.0.0.0 --port 5000
+# https://asgi.readthedocs.io/en/latest/specs/www.html
+
+import os
+import json
+import asyncio
+import numpy as np
+from batch_predict_input import decode_batch_rows, validate_batch_rows, stream_predictions
+from feature_schema import feature_cols
+from microbatcher import MicroBatcher
+from serving_metrics import num_predictions, request_errors, record_microbatch, metrics_payload
+from flask_server_pulls_tar_model_with_prometheus_metrics import watcher
+
+max_batch_size = int(os.environ.get("MICROBATCH_MAX_SIZE", "64"))
+max_wait_seconds = int(os.environ.get("MICROBATCH_MAX_WAIT_US", "500")) / 1e6
+
+
+def predict_rows(rows):
+    return watcher.current.model.predict(rows)
+
+
+batcher = MicroBatcher(predict_rows, max_batch_size=max_batch_size,
+                       max_wait_seconds=max_wait_seconds, on_batch=record_microbatch)
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+async def send_response(send, status, body, content_type="application/json"):
+    if isinstance(body, str):
+        body = body.encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode()),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def predict(receive, send):
+    endpoint = "/predict"
+    try:
+        input_data = json.loads(await read_body(receive))
+    except Exception as e:
+        request_errors.labels(endpoint=endpoint, cause="parse").inc()
+        return await send_response(send, 400, json.dumps({"error": str(e)}))
+
+    try:
+        if not isinstance(input_data, list) or len(input_data) != len(feature_cols):
+            raise ValueError("input error")
+        # values in feature_schema.feature_cols order
+        row = validate_batch_rows(np.asarray([input_data], dtype=np.float32))[0]
+    except Exception as e:
+        request_errors.labels(endpoint=endpoint, cause="validate").inc()
+        return await send_response(send, 400, json.dumps({"error": str(e)}))
+
+    try:
+        prediction = await batcher.predict(row)
+    except Exception as e:
+        request_errors.labels(endpoint=endpoint, cause="predict").inc()
+        return await send_response(send, 500, json.dumps({"error": str(e)}))
+
+    num_predictions.labels(endpoint=endpoint).inc()
+    await send_response(send, 200, json.dumps({"predicted sg_t2g": [prediction]}))
+
+
+async def predict_batch(scope, receive, send):
+    # already vectorized, goes straight to the model instead of through the batcher
+    endpoint = "/predict/batch"
+    headers = dict(scope.get("headers", []))
+    try:
+        rows = decode_batch_rows(await read_body(receive), headers.get(b"content-type", b"").decode())
+    except Exception as e:
+        request_errors.labels(endpoint=endpoint, cause="parse").inc()
+        return await send_response(send, 400, json.dumps({"error": str(e)}))
+
+    try:
+        rows = validate_batch_rows(rows)
+    except Exception as e:
+        request_errors.labels(endpoint=endpoint, cause="validate").inc()
+        return await send_response(send, 400, json.dumps({"error": str(e)}))
+
+    try:
+        # up to max_batch_rows rows, on a thread so the event loop keeps feeding the batcher meanwhile
+        # https://docs.python.org/3/library/asyncio-task.html#asyncio.to_thread
+        predictions = await asyncio.to_thread(predict_rows, rows)
+    except Exception as e:
+        request_errors.labels(endpoint=endpoint, cause="predict").inc()
+        return await send_response(send, 500, json.dumps({"error": str(e)}))
+
+    num_predictions.labels(endpoint=endpoint).inc(len(rows))
+    output_format = "csv" if headers.get(b"accept", b"").startswith(b"text/csv") else "json"
+    await send_response(send, 200, "".join(stream_predictions(predictions, output_format)),
+                        "text/csv" if output_format == "csv" else "application/json")
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            batcher.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await batcher.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+
+    path, method = scope["path"], scope["method"]
+    if path == "/predict" and method == "POST":
+        return await predict(receive, send)
+    if path == "/predict/batch" and method == "POST":
+        return await predict_batch(scope, receive, send)
+    if path == "/metrics" and method == "GET":
+        payload, content_type = metrics_payload()
+        return await send_response(send, 200, payload, content_type)
+    await send_response(send, 404, json.dumps({"error": "not found"}))
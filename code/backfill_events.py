@@ -0,0 +1,215 @@
+# historical backfill for the player_round_stats table and the s3 data/ folder
+# the weekly lambda only looks at events after EVENTS_START_DATE, loading the full history in one
+# invocation ran past the lambda timeout. this walks the whole filtered event list instead, and is
+# meant to run from a shell / container, as long as it takes
+#
+# same outputs as the weekly path: event rows in pga_with_sg_cat_eventslist, rounds in
+# player_round_stats_pga_with_sg_data (ingest_event_rounds + load_event_rounds) and data/ files in s3
+#
+# every finished event is appended to a checkpoint file (one json line, fsynced), so after a crash,
+# a timeout or ctrl-c the next run skips what's done and carries on. failed events are retried next run
+#
+# --shard i/n splits the event list across n processes (or boxes), each with its own checkpoint;
+# the datagolf quota is split evenly between them so the total stays under --requests-per-minute
+#
+# python backfill_events.py --start-date 2017-01-01 --workers 8
+# python backfill_events.py --shard 0/2 & python backfill_events.py --shard 1/2
+
+import os
+import json
+import time
+import argparse
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datagolf_client import DataGolfClient, RateLimiter, datagolf_requests_per_minute
+from eventlist_db import fetch_existing_event_keys, find_new_events, insert_events
+from round_stats_loader import load_event_rounds
+from job_metrics import push_job_duration
+
+
+def event_key(event_info):
+    return f"{str(event_info['tour']).lower()}:{int(event_info['event_id'])}:{int(event_info['calendar_year'])}"
+
+
+def load_checkpoint(path):
+    # keys of the events already loaded; a torn last line (killed mid write) is ignored
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            done[record["key"]] = record
+    return done
+
+
+def drop_torn_line(path):
+    # cut a partial last line back to the last newline, or the next record would be appended onto it
+    # and both lines would be unreadable
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self.done = load_checkpoint(path)
+        drop_torn_line(path)
+        self.file = open(path, "a")
+
+    def record(self, event_info, num_rounds):
+        record = {"key": event_key(event_info), "rounds": num_rounds, "finished_at": time.time()}
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.done[record["key"]] = record
+
+    def close(self):
+        self.file.close()
+
+
+def select_shard(event_df, shard, num_shards):
+    # by event id, so an event always lands in the same shard whatever the date range
+    return event_df[event_df["event_id"].astype("int64") % num_shards == shard]
+
+
+def select_backfill_events(event_df, done, start_date=None, end_date=None, shard=0, num_shards=1):
+    event_df = event_df.copy()
+    event_df["date"] = pd.to_datetime(event_df["date"])
+    if start_date:
+        event_df = event_df[event_df["date"] >= pd.Timestamp(start_date)]
+    if end_date:
+        event_df = event_df[event_df["date"] <= pd.Timestamp(end_date)]
+    event_df = select_shard(event_df, shard, num_shards)
+    is_todo = [event_key(event_info) not in done for event_info in event_df.to_dict("records")]
+    # oldest first, so progress reads like a calendar
+    return event_df[is_todo].sort_values("date")
+
+
+class Progress:
+    def __init__(self, total):
+        self.total = total
+        self.events = 0
+        self.failed = 0
+        self.rounds = 0
+        self.start = time.perf_counter()
+
+    def report(self, event_info, num_rounds):
+        elapsed = time.perf_counter() - self.start
+        events_per_second = self.events / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.events - self.failed
+        eta = remaining / events_per_second if events_per_second > 0 else float("inf")
+        print(f"[{self.events + self.failed}/{self.total}] event={event_info['event_id']} "
+              f"{event_info['date'].date()} {num_rounds} rounds | {self.rounds} rounds total, "
+              f"{events_per_second:.2f} events/s, {self.rounds / max(elapsed, 1e-9):.0f} rounds/s, "
+              f"eta {eta / 60:.1f} min, {self.failed} failed")
+
+
+def insert_event_rows(connection, event_df):
+    # the same set based dedup the weekly path uses, the event rows go in before their rounds
+    with connection.cursor() as cursor:
+        existing_keys_df = fetch_existing_event_keys(cursor, event_df["calendar_year"].unique())
+        num_new_events = insert_events(cursor, find_new_events(event_df, existing_keys_df))
+    connection.commit()
+    return num_new_events
+
+
+def backfill(checkpoint_path, start_date=None, end_date=None, workers=8, shard=0, num_shards=1,
+             requests_per_minute=datagolf_requests_per_minute, api_key=None):
+    # imported here so the checkpoint / event selection helpers don't need pymysql and boto3
+    import lambda_get_and_update_events as ingestion
+
+    job_start = time.perf_counter()
+    api_key = api_key or os.environ.get('API_KEY')
+    if not api_key:
+        raise ValueError("API_KEY is not set")
+
+    # one limiter shared by every worker thread, this shard's slice of the quota
+    client = DataGolfClient(api_key, pool_size=workers,
+                            rate_limiter=RateLimiter(requests_per_minute / num_shards / 60))
+    event_df = client.get_event_list(feed_cache=ingestion.make_feed_cache(),
+                                     transform=ingestion.filter_pga_sg_events, variant="pga_sg_traditional")
+
+    checkpoint = Checkpoint(checkpoint_path)
+    todo_df = select_backfill_events(event_df, checkpoint.done, start_date, end_date, shard, num_shards)
+    print(f"shard {shard}/{num_shards}: {len(todo_df)} events to load, "
+          f"{len(checkpoint.done)} already done per {checkpoint_path}")
+
+    progress = Progress(len(todo_df))
+    connection = ingestion.connect_db()
+    try:
+        if len(todo_df):
+            print(f"{insert_event_rows(connection, todo_df)} new event rows")
+
+        # downloads and s3 uploads on the pool, the db load on this thread over the one connection
+        # at most 2 * workers downloads in flight, so finished frames don't pile up behind a slow db
+        events = iter(todo_df.to_dict("records"))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+
+            def submit_next():
+                event_info = next(events, None)
+                if event_info is not None:
+                    pending[executor.submit(ingestion.ingest_event_rounds, client, event_info)] = event_info
+
+            for _ in range(2 * workers):
+                submit_next()
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    event_info = pending.pop(future)
+                    submit_next()
+                    rounds_df, uploaded = future.result()
+                    if rounds_df is None or not uploaded:
+                        # not checkpointed, the next run downloads, uploads and loads it again
+                        progress.failed += 1
+                        continue
+                    try:
+                        num_rounds = load_event_rounds(connection, rounds_df, event_info['tour'],
+                                                       event_info['event_id'], event_info['calendar_year'])
+                    except Exception as e:
+                        print(f"error loading rounds for event={event_info['event_id']}:", e)
+                        progress.failed += 1
+                        continue
+                    checkpoint.record(event_info, num_rounds)
+                    progress.events += 1
+                    progress.rounds += num_rounds
+                    progress.report(event_info, num_rounds)
+    finally:
+        connection.close()
+        checkpoint.close()
+
+    seconds = time.perf_counter() - job_start
+    print(f"backfill done: {progress.events} events, {progress.rounds} rounds in {seconds:.1f}s "
+          f"({progress.events / max(seconds, 1e-9):.2f} events/s), {progress.failed} failed"
+          + (", rerun to retry them" if progress.failed else ""))
+    push_job_duration("backfill_events", seconds, succeeded=progress.failed == 0,
+                      extra={"events": progress.events, "rounds": progress.rounds, "failed": progress.failed})
+    return {"events": progress.events, "rounds": progress.rounds, "failed": progress.failed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start-date", default=None, help="first event date, default the whole history")
+    parser.add_argument("--end-date", default=None)
+    parser.add_argument("--workers", type=int, default=8)
+    # e.g. --shard 0/4
+    parser.add_argument("--shard", default="0/1")
+    parser.add_argument("--requests-per-minute", type=float, default=datagolf_requests_per_minute,
+                        help="datagolf quota shared by all shards")
+    parser.add_argument("--checkpoint", default=None,
+                        help="default backfill_checkpoint.shard-{i}-of-{n}.jsonl in the working directory")
+    args = parser.parse_args()
+
+    shard, num_shards = (int(part) for part in args.shard.split("/"))
+    checkpoint_path = args.checkpoint or f"backfill_checkpoint.shard-{shard}-of-{num_shards}.jsonl"
+    result = backfill(checkpoint_path, start_date=args.start_date, end_date=args.end_date, workers=args.workers,
+                      shard=shard, num_shards=num_shards, requests_per_minute=args.requests_per_minute)
+    exit(1 if result["failed"] else 0)
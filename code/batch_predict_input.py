@@ -0,0 +1,98 @@
+import io
+import json
+import numpy as np
+from feature_schema import feature_cols, to_float32_matrix, validate_matrix
+
+# parsing and streaming helpers for the /predict/batch endpoint
+# kept out of the flask server so it can be tested without pulling a model from s3
+
+num_features = len(feature_cols)
+max_batch_rows = 100000
+stream_chunk_rows = 2048
+
+
+def parse_batch_rows(body, content_type):
+    # turns a request body into one (n, 9) float32 block so the model can score it in a single call
+    return validate_batch_rows(decode_batch_rows(body, content_type))
+
+
+def check_row_count(num_rows):
+    if num_rows > max_batch_rows:
+        raise ValueError(f"too many rows: more than {max_batch_rows}")
+
+
+def csv_has_header(first_line):
+    # a header is the feature names, in feature_cols order; anything else is data (a leading nan included)
+    fields = [field.strip().strip('"').lower() for field in first_line.split(",")]
+    if not set(fields) & set(feature_cols):
+        return False
+    if fields != feature_cols:
+        raise ValueError(f"csv header must be {','.join(feature_cols)}")
+    return True
+
+
+def decode_batch_rows(body, content_type):
+    # json: [[9 values], [9 values], ...] or {"rows": [[...], ...]}
+    # csv: one row per line, optional header line
+    # octet-stream: raw little endian float32, row major, 9 values per row
+    # the row limit is checked before (or, for csv, while) the rows are converted, not after
+    content_type = (content_type or "application/json").split(";")[0].strip().lower()
+
+    if content_type == "application/octet-stream":
+        if len(body) % (num_features * 4) != 0:
+            raise ValueError(f"binary body must be a multiple of {num_features} float32 values")
+        check_row_count(len(body) // (num_features * 4))
+        # https://numpy.org/doc/stable/reference/generated/numpy.frombuffer.html
+        rows = np.frombuffer(body, dtype="<f4").reshape(-1, num_features)
+    elif content_type == "text/csv":
+        text = body.decode("utf-8") if isinstance(body, bytes) else body
+        first_line = text.lstrip().split("\n", 1)[0]
+        has_header = csv_has_header(first_line)
+        # parsing stops one row past the limit
+        # https://numpy.org/doc/stable/reference/generated/numpy.loadtxt.html
+        rows = np.loadtxt(io.StringIO(text.lstrip()), delimiter=",", skiprows=1 if has_header else 0,
+                          max_rows=max_batch_rows + 1, dtype=np.float32, ndmin=2)
+        check_row_count(len(rows))
+    elif content_type == "application/json":
+        data = json.loads(body) if isinstance(body, (bytes, str)) else body
+        if isinstance(data, dict):
+            data = data.get("rows")
+        if not isinstance(data, list):
+            raise ValueError("json body must be a list of rows")
+        check_row_count(len(data))
+        rows = np.asarray(data, dtype=np.float32)
+    else:
+        raise ValueError(f"unsupported content type: {content_type}")
+
+    return rows
+
+
+def validate_batch_rows(rows):
+    # one vectorized check over the whole block instead of per row
+    # shape, float32 and the nan / inf / range checks come from feature_schema.py
+    rows = np.asarray(rows)
+    if rows.ndim != 2 or rows.shape[1] != num_features:
+        raise ValueError(f"expected rows of {num_features} features, got shape {rows.shape}")
+    if rows.shape[0] == 0:
+        raise ValueError("no rows")
+    check_row_count(rows.shape[0])
+    return validate_matrix(to_float32_matrix(rows))
+
+
+def stream_predictions(predictions, output_format="json"):
+    # yields the response in chunks so a large field of players isn't built as one big string
+    # https://flask.palletsprojects.com/en/stable/patterns/streaming/
+    predictions = np.asarray(predictions, dtype=np.float64).ravel()
+    if output_format == "csv":
+        yield "predicted_sg_t2g\n"
+        for start in range(0, len(predictions), stream_chunk_rows):
+            chunk = predictions[start:start + stream_chunk_rows]
+            yield "\n".join(repr(value) for value in chunk.tolist()) + "\n"
+        return
+
+    yield '{"predicted sg_t2g": ['
+    for start in range(0, len(predictions), stream_chunk_rows):
+        chunk = predictions[start:start + stream_chunk_rows]
+        prefix = "," if start > 0 else ""
+        yield prefix + ",".join(repr(value) for value in chunk.tolist())
+    yield "]}"
@@ -0,0 +1,212 @@
+import io
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from round_stats_loader import round_stats_cols
+from feature_schema import feature_cols, model_cols, value_ranges
+
+# local stand-ins for everything the pipeline normally talks to over the network,
+# so benchmark_suite.py runs offline and gives the same numbers run to run
+# synthetic player-round data, a datagolf feed on localhost, an in memory s3 and sqlite for mysql
+
+# roughly the scale of real pga rounds: mean, std
+feature_distributions = {
+    'sg_total': (0.0, 2.8), 'driving_dist': (0.0, 12.0), 'driving_acc': (0.6, 0.15),
+    'gir': (0.66, 0.12), 'scrambling': (0.58, 0.2), 'prox_rgh': (45.0, 10.0),
+    'prox_fw': (33.0, 6.0), 'great_shots': (2.0, 1.4), 'poor_shots': (3.0, 1.7),
+}
+true_coef = np.array([0.7, 0.02, 1.5, 4.0, 1.0, -0.01, -0.03, 0.2, -0.25])
+
+events_table = "pga_with_sg_cat_eventslist"
+rounds_table = "player_round_stats_pga_with_sg_data"
+
+
+def synthetic_model_rows(num_rows, seed=0):
+    # sg_t2g is a noisy linear function of the features, so a fitted model has something to find
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({col: rng.normal(mean, std, num_rows).clip(*value_ranges[col])
+                       for col, (mean, std) in feature_distributions.items()})
+    df['sg_t2g'] = df[feature_cols].to_numpy() @ true_coef - 3.5 + rng.normal(0, 0.5, num_rows)
+    return df[model_cols]
+
+
+def synthetic_rounds(event_id, year, num_players=150, seed=None):
+    # one player_round response: 4 rounds per player, every column the loader stores
+    num_rows = num_players * 4
+    df = synthetic_model_rows(num_rows, seed=event_id if seed is None else seed)
+    df['tour'] = 'pga'
+    df['year'] = year
+    df['season'] = year
+    df['event_name'] = f"Synthetic Open {event_id}"
+    df['event_id'] = event_id
+    df['player_name'] = [f"Player {i // 4}" for i in range(num_rows)]
+    df['dg_id'] = np.arange(num_rows) // 4
+    df['fin_text'] = 'T10'
+    df['round_num'] = np.arange(num_rows) % 4 + 1
+    df['course_name'] = 'Synthetic National'
+    df['course_num'] = 1
+    df['course_par'] = 72
+    df['start_hole'] = 1
+    df['teetime'] = '8:00am'
+    df['round_score'] = 72 - df['sg_total'].round()
+    for col in ['sg_putt', 'sg_arg', 'sg_app', 'sg_ott']:
+        df[col] = df['sg_total'] / 4
+    return df[round_stats_cols]
+
+
+def synthetic_event_list(num_events, first_date="2025-03-02", first_event_id=1000):
+    # weekly pga events with sg and traditional stats, so the lambda keeps every one of them
+    dates = pd.date_range(first_date, periods=num_events, freq="7D")
+    return pd.DataFrame({
+        "calendar_year": dates.year,
+        "date": dates.strftime("%Y-%m-%d"),
+        "event_id": range(first_event_id, first_event_id + num_events),
+        "event_name": [f"Synthetic Open {i}" for i in range(num_events)],
+        "sg_categories": "yes",
+        "tour": "pga",
+        "traditional_stats": "yes",
+    })
+
+
+class DataGolfStandIn:
+    # serves the event-list and rounds csv feeds on localhost, same paths as feeds.datagolf.com
+    def __init__(self, event_df):
+        self.set_events(event_df)
+        self.num_requests = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                stand_in.num_requests += 1
+                if url.path.endswith("event-list"):
+                    body = stand_in.event_csv
+                elif url.path.endswith("rounds"):
+                    query = parse_qs(url.query)
+                    body = synthetic_rounds(int(query["event_id"][0]),
+                                            int(query["year"][0])).to_csv(index=False).encode()
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def set_events(self, event_df):
+        self.event_csv = event_df.to_csv(index=False).encode()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class S3StandIn:
+    # the put_object / get_object calls ingestion makes, objects kept in memory
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body if isinstance(Body, bytes) else Body.encode()
+        return {"ETag": f'"{len(self.objects)}"'}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        from botocore.exceptions import ClientError
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey", "Message": Key}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def data_objects(self):
+        # the training files ingestion uploaded, without the feed cache entries
+        return [key for _, key in self.objects if key.startswith("data/")]
+
+
+# sqlite standing in for the mysql rds instance, behind the small slice of the pymysql api the lambda uses
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.float64, float)
+sqlite3.register_adapter(pd.Timestamp, str)
+
+
+def to_sqlite(query):
+    return (query.replace("%s", "?")
+            .replace("ON DUPLICATE KEY UPDATE event_id = event_id", "ON CONFLICT DO NOTHING"))
+
+
+class SqliteCursor:
+    def __init__(self, connection):
+        self.cursor = connection.cursor()
+        self.rowcount = 0
+
+    def execute(self, query, params=()):
+        self.cursor.execute(to_sqlite(query), tuple(params))
+        self.rowcount = self.cursor.rowcount
+        return self.rowcount
+
+    def executemany(self, query, rows):
+        self.cursor.executemany(to_sqlite(query), [tuple(row) for row in rows])
+        self.rowcount = self.cursor.rowcount
+        return self.rowcount
+
+    def fetchall(self):
+        # DictCursor rows
+        names = [d[0] for d in self.cursor.description]
+        return [dict(zip(names, row)) for row in self.cursor.fetchall()]
+
+    def close(self):
+        self.cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SqliteConnection:
+    def __init__(self, db_path):
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+
+    def cursor(self):
+        return SqliteCursor(self.connection)
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        self.connection.close()
+
+
+def create_sqlite_db(db_path):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    connection = sqlite3.connect(db_path)
+    connection.execute(f"""
+        CREATE TABLE {events_table} (
+            calendar_year INTEGER, date TEXT, event_id INTEGER, event_name TEXT,
+            sg_categories TEXT, tour TEXT, traditional_stats TEXT,
+            PRIMARY KEY (event_id, tour, calendar_year)
+        )
+    """)
+    connection.execute(f"CREATE TABLE {rounds_table} ({', '.join(round_stats_cols)})")
+    connection.execute(f"CREATE INDEX rounds_event ON {rounds_table} (tour, event_id, year)")
+    connection.commit()
+    connection.close()
@@ -0,0 +1,360 @@
+# offline benchmark suite for serving, ingestion and training
+# everything runs locally on synthetic player-round data (benchmark_standins.py):
+# no s3, no rds, no datagolf api key needed
+#
+#   serving    /predict latency percentiles (in process) and qps over http at a fixed concurrency
+#   ingestion  lambda_handler wall time against the number of new events
+#   fine_tune  fine_tune.update_model rows/s against the number of rows
+#   train      train_and_save_model rows/s against the number of rows
+#
+# python benchmark_suite.py --output results.json
+# python benchmark_suite.py --output results.json --baseline baseline.json
+#
+# with --baseline, every metric is compared against the stored run and the exit code is 1 if any
+# got worse by more than --tolerance (default 20%), so it can gate a change in ci
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# the benchmarks should never push to a real pushgateway
+os.environ.pop("PUSHGATEWAY_URL", None)
+
+import benchmark_standins as standins
+
+default_sizes = {
+    "serving_requests": 2000,
+    "ingestion_events": [5, 20, 50],
+    "fine_tune_rows": [10000, 100000, 1000000],
+    "train_rows": [10000, 100000, 1000000],
+}
+quick_sizes = {
+    "serving_requests": 300,
+    "ingestion_events": [2, 5],
+    "fine_tune_rows": [5000, 20000],
+    "train_rows": [5000, 20000],
+}
+suites = ["serving", "ingestion", "fine_tune", "train"]
+
+
+def metric(value, unit, better):
+    return {"value": round(float(value), 6), "unit": unit, "better": better}
+
+
+@contextlib.contextmanager
+def quiet():
+    # the pipeline prints per event / per epoch progress, keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def timed(fn, repeat):
+    # median of repeat runs, so one slow outlier doesn't move the number
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return float(np.median(seconds))
+
+
+def percentiles_ms(latencies):
+    latencies_ms = np.asarray(latencies) * 1000
+    return {f"p{p}": float(np.percentile(latencies_ms, p)) for p in (50, 90, 95, 99)}
+
+
+def write_synthetic_model(model_dir, num_rows=20000, seed=1):
+    # same {"scaler", "model"} pkl (plus the folded npz) train_initial_model_bulk_data.py writes
+    from sklearn.linear_model import SGDRegressor
+    from sklearn.preprocessing import StandardScaler
+    from train_initial_model_bulk_data import save_model
+
+    df = standins.synthetic_model_rows(num_rows, seed=seed)
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(df[standins.feature_cols].to_numpy())
+    model = SGDRegressor(loss="squared_error", random_state=seed).fit(X_scaled, df['sg_t2g'].to_numpy())
+    os.makedirs(model_dir, exist_ok=True)
+    with quiet():
+        save_model(scaler, model, os.path.join(model_dir, "sg_t2g_model_v2.pkl"))
+
+
+def write_training_files(data_dir, num_rows, data_format, rows_per_file=600, seed=0):
+    # one file per synthetic event, laid out the way ingestion writes them to s3
+    from training_data_io import serialize_training_frame, training_data_key
+
+    df = standins.synthetic_model_rows(num_rows, seed=seed)
+    for file_num, start in enumerate(range(0, num_rows, rows_per_file)):
+        key = training_data_key(file_num, "2025-03-02", 2025, data_format)
+        path = os.path.join(data_dir, os.path.relpath(key, "data"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        body = serialize_training_frame(df.iloc[start:start + rows_per_file], data_format)
+        with open(path, "wb" if isinstance(body, bytes) else "w") as f:
+            f.write(body)
+
+
+def bench_serving(work_dir, sizes, args):
+    # the server module loads its model when imported, so it has to be pointed at a local model first
+    model_dir = os.path.join(work_dir, "serving_model")
+    write_synthetic_model(model_dir)
+    os.environ.update(MODEL_LOCAL_DIR=model_dir, MODEL_EXTRACT_DIR=os.path.join(work_dir, "serving_app"),
+                      MODEL_SERVING_MODE=args.serving_mode, PREFORK_SERVER="1")
+    with quiet():
+        import flask_server_pulls_tar_model_with_prometheus_metrics as server
+
+    num_requests = sizes["serving_requests"]
+    rng = np.random.default_rng(0)
+    bodies = [json.dumps(row) for row in
+              standins.synthetic_model_rows(num_requests, seed=2)[standins.feature_cols].to_numpy().tolist()]
+
+    # latency: one request at a time through the flask test client, no socket in the way
+    client = server.app.test_client()
+    for body in bodies[:50]:
+        client.post("/predict", data=body, content_type="application/json")
+    latencies = []
+    for body in bodies:
+        start = time.perf_counter()
+        response = client.post("/predict", data=body, content_type="application/json")
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    # throughput: a threaded http server on localhost and args.concurrency clients posting in a loop
+    import logging
+    import requests
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{http_server.server_port}/predict"
+    sessions = threading.local()
+
+    def post(body):
+        if not hasattr(sessions, "session"):
+            sessions.session = requests.Session()
+        sessions.session.post(url, data=body, headers={"Content-Type": "application/json"}).raise_for_status()
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(post, bodies[:args.concurrency * 5]))
+            order = rng.permutation(num_requests)
+            start = time.perf_counter()
+            list(executor.map(post, [bodies[i] for i in order]))
+            seconds = time.perf_counter() - start
+    finally:
+        http_server.shutdown()
+
+    results = {f"serving.predict.latency_{name}_ms": metric(value, "ms", "lower")
+               for name, value in percentiles_ms(latencies).items()}
+    results["serving.predict.qps_in_process"] = metric(num_requests / sum(latencies), "req/s", "higher")
+    results[f"serving.predict.qps_http_c{args.concurrency}"] = metric(num_requests / seconds, "req/s", "higher")
+    return results
+
+
+def bench_ingestion(work_dir, sizes, args):
+    # module level config in datagolf_client and the lambda is read on import
+    with standins.DataGolfStandIn(standins.synthetic_event_list(1)) as datagolf:
+        os.environ.update(DATAGOLF_BASE_URL=datagolf.base_url, API_KEY="benchmark", S3_BUCKET="benchmark",
+                          # the real quota (45/min) would be all the benchmark measured
+                          DATAGOLF_REQUESTS_PER_MINUTE=str(args.datagolf_rpm))
+        os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+        import lambda_get_and_update_events as ingestion
+
+        db_path = os.path.join(work_dir, "ingestion.sqlite")
+        original_connect = ingestion.pymysql.connect
+        ingestion.pymysql.connect = lambda **kwargs: standins.SqliteConnection(db_path)
+        results = {}
+        try:
+            for num_events in sizes["ingestion_events"]:
+                datagolf.set_events(standins.synthetic_event_list(num_events))
+                seconds = []
+                for _ in range(args.repeat):
+                    # every run starts from an empty db so all events are new
+                    standins.create_sqlite_db(db_path)
+                    ingestion.s3_client = standins.S3StandIn()
+                    start = time.perf_counter()
+                    with quiet():
+                        response = ingestion.lambda_handler({}, None)
+                    seconds.append(time.perf_counter() - start)
+                    if response["statusCode"] != 200:
+                        raise RuntimeError(f"lambda_handler failed: {response['body']}")
+                    num_uploads = len(ingestion.s3_client.data_objects())
+                    if num_uploads != num_events:
+                        raise RuntimeError(f"expected {num_events} uploads, got {num_uploads}")
+                median = float(np.median(seconds))
+                results[f"ingestion.events_{num_events}.seconds"] = metric(median, "s", "lower")
+                results[f"ingestion.events_{num_events}.events_per_s"] = metric(num_events / median, "events/s", "higher")
+        finally:
+            ingestion.pymysql.connect = original_connect
+    return results
+
+
+def bench_fine_tune(work_dir, sizes, args):
+    import fine_tune
+
+    model_dir = os.path.join(work_dir, "fine_tune_model")
+    write_synthetic_model(model_dir)
+    results = {}
+    for num_rows in sizes["fine_tune_rows"]:
+        data_dir = os.path.join(work_dir, f"fine_tune_data_{num_rows}")
+        output_dir = os.path.join(work_dir, f"fine_tune_output_{num_rows}")
+        write_training_files(data_dir, num_rows, args.data_format)
+        os.makedirs(output_dir, exist_ok=True)
+        # no manifest in the input model dir, so every repeat trains on all the files
+        os.environ.update(SM_CHANNEL_MODEL=model_dir, SM_CHANNEL_TRAINING=data_dir, SM_MODEL_DIR=output_dir)
+
+        def run():
+            with quiet():
+                fine_tune.update_model(batch_size=args.batch_size, workers=args.workers)
+
+        seconds = timed(run, args.repeat)
+        results[f"fine_tune.rows_{num_rows}.seconds"] = metric(seconds, "s", "lower")
+        results[f"fine_tune.rows_{num_rows}.rows_per_s"] = metric(num_rows / seconds, "rows/s", "higher")
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return results
+
+
+def bench_train(work_dir, sizes, args):
+    from training_data_io import serialize_training_frame
+    from train_initial_model_bulk_data import train_and_save_model
+
+    results = {}
+    for num_rows in sizes["train_rows"]:
+        data_path = os.path.join(work_dir, f"train_{num_rows}.{args.data_format}")
+        body = serialize_training_frame(standins.synthetic_model_rows(num_rows, seed=3), args.data_format)
+        with open(data_path, "wb" if isinstance(body, bytes) else "w") as f:
+            f.write(body)
+        model_path = os.path.join(work_dir, f"train_{num_rows}.pkl")
+
+        def run():
+            with quiet():
+                train_and_save_model(data_path, model_path)
+
+        seconds = timed(run, args.repeat)
+        results[f"train.rows_{num_rows}.seconds"] = metric(seconds, "s", "lower")
+        results[f"train.rows_{num_rows}.rows_per_s"] = metric(num_rows / seconds, "rows/s", "higher")
+        os.remove(data_path)
+    return results
+
+
+benchmarks = {
+    "serving": bench_serving,
+    "ingestion": bench_ingestion,
+    "fine_tune": bench_fine_tune,
+    "train": bench_train,
+}
+
+
+def environment_info():
+    import pandas
+    import sklearn
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    # relative change per metric, flipped so a positive change is always "worse"
+    comparison = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or previous["value"] == 0:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        worse_by = change if current["better"] == "lower" else -change
+        comparison[name] = {
+            "baseline": previous["value"],
+            "current": current["value"],
+            "change": round(change, 4),
+            "regressed": worse_by > tolerance,
+        }
+    return comparison
+
+
+def print_report(results, comparison):
+    for name, result in results.items():
+        line = f"{name:<45} {result['value']:>14.3f} {result['unit']}"
+        if name in comparison:
+            compared = comparison[name]
+            line += f"  ({compared['change']:+.1%} vs baseline{', REGRESSION' if compared['regressed'] else ''})"
+        print(line, file=sys.stderr)
+
+
+def run_benchmarks(selected, sizes, args):
+    work_dir = tempfile.mkdtemp(prefix="sg_t2g_bench_")
+    results = {}
+    try:
+        for name in selected:
+            start = time.perf_counter()
+            print(f"running {name} benchmarks", file=sys.stderr)
+            suite_dir = os.path.join(work_dir, name)
+            os.makedirs(suite_dir)
+            results.update(benchmarks[name](suite_dir, sizes, args))
+            print(f"{name} done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suite", nargs="+", choices=suites, default=suites)
+    parser.add_argument("--output", help="write the json report here (default: stdout)")
+    parser.add_argument("--baseline", help="json report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown per metric")
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a smoke run")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the median is reported")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--serving-mode", choices=["pkl", "numpy"], default="pkl")
+    parser.add_argument("--data-format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--datagolf-rpm", type=float, default=600000)
+    args = parser.parse_args()
+
+    sizes = quick_sizes if args.quick else default_sizes
+    results = run_benchmarks(args.suite, sizes, args)
+
+    report = {
+        "environment": environment_info(),
+        "config": dict(vars(args), sizes=sizes),
+        "results": results,
+    }
+    comparison = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare_to_baseline(results, json.load(f)["results"], args.tolerance)
+        report["comparison"] = comparison
+    print_report(results, comparison)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if any(compared["regressed"] for compared in comparison.values()):
+        sys.exit(1)
@@ -0,0 +1,94 @@
+import io
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer
+import pytest
+
+
+@pytest.fixture
+def local_http_server():
+    # start(handler_class) serves the handler on a free local port and returns its base url,
+    # every server started is shut down after the test
+    servers = []
+
+    def start(handler_class):
+        quiet_handler = type(handler_class.__name__, (handler_class,), {"log_message": lambda self, *args: None})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), quiet_handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+class NoSuchKey(Exception):
+    # what botocore's ClientError carries, model_pointer.error_code reads it the same way
+    response = {"Error": {"Code": "NoSuchKey"}}
+
+
+class PreconditionFailed(Exception):
+    response = {"Error": {"Code": "PreconditionFailed"}}
+
+
+class FakeS3:
+    # the s3 client calls the training and publishing code makes, against a dict of key -> bytes
+    # put_object honors IfMatch / IfNoneMatch the way s3 conditional writes do, ETags are quoted md5s,
+    # every write is a second newer than the last and listings come back two keys per page
+    def __init__(self):
+        self.objects = {}
+        self.last_modified = {}
+        self.downloaded = []
+        self.clock = datetime(2026, 1, 1)
+
+    def etag(self, key):
+        return f'"{hashlib.md5(self.objects[key]).hexdigest()}"'
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, IfMatch=None, IfNoneMatch=None):
+        # https://docs.aws.amazon.com/AmazonS3/latest/userguide/conditional-writes.html
+        exists = Key in self.objects
+        if (IfNoneMatch == "*" and exists) or (IfMatch is not None and (not exists or IfMatch != self.etag(Key))):
+            raise PreconditionFailed(Key)
+        self.objects[Key] = Body
+        self.clock += timedelta(seconds=1)
+        self.last_modified[Key] = self.clock
+        return {"ETag": self.etag(Key)}
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise NoSuchKey(Key)
+        return {"Body": io.BytesIO(self.objects[Key]), "ETag": self.etag(Key)}
+
+    def upload_file(self, path, bucket, key):
+        with open(path, "rb") as f:
+            self.put_object(Bucket=bucket, Key=key, Body=f.read())
+
+    def download_file(self, bucket, key, path):
+        self.downloaded.append(key)
+        with open(path, "wb") as f:
+            f.write(self.get_object(Bucket=bucket, Key=key)["Body"].read())
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            self.objects.pop(item["Key"], None)
+            self.last_modified.pop(item["Key"], None)
+
+    def get_paginator(self, name):
+        fake = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                contents = [{"Key": key, "Size": len(body), "LastModified": fake.last_modified[key],
+                             "ETag": fake.etag(key)}
+                            for key, body in sorted(fake.objects.items()) if key.startswith(Prefix)]
+                for start in range(0, len(contents), 2):
+                    yield {"Contents": contents[start:start + 2]}
+        return Paginator()
+
+
+@pytest.fixture
+def fake_s3():
+    return FakeS3()
@@ -0,0 +1,109 @@
+import io
+import os
+import time
+import random
+import threading
+import requests
+import pandas as pd
+from requests.adapters import HTTPAdapter
+
+# shared http client for the datagolf feeds
+# one keep-alive connection pool, per request timeouts, retries with backoff,
+# and a client side rate limit that every thread goes through (retries included)
+# DATAGOLF_BASE_URL can point at a local fake server for testing
+
+datagolf_base_url = os.environ.get("DATAGOLF_BASE_URL", "https://feeds.datagolf.com")
+# datagolf allows 45 requests a minute per key https://datagolf.com/api-access
+datagolf_requests_per_minute = float(os.environ.get("DATAGOLF_REQUESTS_PER_MINUTE", "45"))
+
+retry_status_codes = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    # token bucket, safe to share between threads
+    def __init__(self, rate_per_second, burst=1):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate_per_second)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate_per_second
+            time.sleep(wait)
+
+
+def make_session(pool_size=10):
+    # https://requests.readthedocs.io/en/latest/user/advanced/#session-objects
+    # https://requests.readthedocs.io/en/latest/api/#requests.adapters.HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class DataGolfClient:
+    def __init__(self, api_key, base_url=None, session=None, rate_limiter=None,
+                 timeout=(3.05, 30), max_retries=4, backoff_seconds=1.0, pool_size=10):
+        self.api_key = api_key
+        self.base_url = (base_url or datagolf_base_url).rstrip("/")
+        self.session = session or make_session(pool_size)
+        self.rate_limiter = rate_limiter or RateLimiter(datagolf_requests_per_minute / 60)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+    def get(self, path, params, headers=None):
+        # headers carries If-None-Match / If-Modified-Since for conditional requests (feed_cache.py),
+        # a 304 comes back as a normal response with an empty body
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        params = dict(params, file_format="csv", key=self.api_key)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f"datagolf request error on {path}, retrying:", e)
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code in retry_status_codes and attempt < self.max_retries:
+                # https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Retry-After
+                retry_after = response.headers.get("Retry-After")
+                wait = float(retry_after) if retry_after and retry_after.isdigit() else self._backoff(attempt)
+                print(f"datagolf returned {response.status_code} on {path}, retrying in {wait:.1f}s")
+                time.sleep(wait)
+                continue
+
+            # https://www.geeksforgeeks.org/response-raise_for_status-python-requests/#
+            response.raise_for_status()
+            return response
+
+    def get_csv(self, path, params):
+        # https://andrewpwheeler.com/2022/11/02/using-io-objects-in-python-to-read-data/
+        return pd.read_csv(io.StringIO(self.get(path, params).text))
+
+    def get_event_list(self, feed_cache=None, transform=None, variant=""):
+        # with a FeedCache an unchanged feed is a 304 and the cached, already transformed frame
+        if feed_cache is not None:
+            return feed_cache.get_frame(self, "historical-raw-data/event-list", {}, transform, variant)
+        event_df = self.get_csv("historical-raw-data/event-list", {})
+        return transform(event_df) if transform is not None else event_df
+
+    def get_rounds(self, tour, event_id, year):
+        return self.get_csv("historical-raw-data/rounds", {"tour": tour, "event_id": event_id, "year": year})
+
+    def _backoff(self, attempt):
+        # exponential backoff with jitter so parallel workers don't retry in lockstep
+        return self.backoff_seconds * (2 ** attempt) * (0.5 + random.random() / 2)
@@ -0,0 +1,62 @@
+import pandas as pd
+
+# set based dedup of the event list against the pga_with_sg_cat_eventslist table
+# one select for the existing keys, an anti-join in pandas, and one batched insert,
+# so the number of db round trips stays the same however long the event list gets
+
+event_key_cols = ["event_id", "tour", "calendar_year"]
+event_insert_cols = ["calendar_year", "date", "event_id", "event_name", "sg_categories", "tour", "traditional_stats"]
+
+
+def normalize_event_keys(df):
+    keys = df[event_key_cols].copy()
+    keys["event_id"] = keys["event_id"].astype("int64")
+    keys["calendar_year"] = keys["calendar_year"].astype("int64")
+    keys["tour"] = keys["tour"].astype(str)
+    return keys
+
+
+def fetch_existing_event_keys(cursor, calendar_years):
+    # only the years in the feed can collide, so there's no need to pull the whole table
+    calendar_years = [int(year) for year in calendar_years]
+    if not calendar_years:
+        return pd.DataFrame(columns=event_key_cols)
+    placeholders = ", ".join(["%s"] * len(calendar_years))
+    cursor.execute(f"""
+        SELECT event_id, tour, calendar_year
+        FROM pga_with_sg_cat_eventslist
+        WHERE calendar_year IN ({placeholders})
+    """, calendar_years)
+    return pd.DataFrame(list(cursor.fetchall()), columns=event_key_cols)
+
+
+def find_new_events(event_df, existing_keys_df):
+    # anti-join: keep the feed rows whose (event_id, tour, calendar_year) isn't already in the table
+    # https://pandas.pydata.org/docs/reference/api/pandas.DataFrame.merge.html
+    if existing_keys_df.empty:
+        return event_df.drop_duplicates(subset=event_key_cols)
+    merged = normalize_event_keys(event_df).merge(
+        normalize_event_keys(existing_keys_df).drop_duplicates(),
+        on=event_key_cols, how="left", indicator=True
+    )
+    is_new = (merged["_merge"] == "left_only").to_numpy()
+    return event_df[is_new].drop_duplicates(subset=event_key_cols)
+
+
+def insert_events(cursor, new_events_df):
+    if new_events_df.empty:
+        return 0
+    # pymysql turns executemany on an INSERT ... VALUES into one multi-row insert
+    # https://pymysql.readthedocs.io/en/latest/modules/cursors.html#pymysql.cursors.Cursor.executemany
+    # on duplicate key keeps a rerun (or a race with another run) from failing the whole batch
+    insert_event_query = """
+        INSERT INTO pga_with_sg_cat_eventslist (
+            calendar_year, date, event_id, event_name,
+            sg_categories, tour, traditional_stats
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE event_id = event_id
+    """
+    rows = new_events_df[event_insert_cols].astype(object).to_numpy().tolist()
+    cursor.executemany(insert_event_query, rows)
+    return len(rows)
@@ -0,0 +1,122 @@
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+# the one definition of the model's inputs, used by ingestion, both training scripts and the server
+# every path turns its data into the same thing: a C contiguous float32 matrix, columns in this order,
+# checked in one vectorized pass (missing columns, non numeric dtypes, nan / inf and value ranges)
+# saved models carry schema_hash, so a model trained on a different feature set fails when it's
+# loaded instead of returning nonsense on every request
+
+feature_cols = ['sg_total', 'driving_dist', 'driving_acc', 'gir', 'scrambling',
+                'prox_rgh', 'prox_fw', 'great_shots', 'poor_shots']
+target_col = 'sg_t2g'
+# the columns the training data files keep, label first
+model_cols = [target_col] + feature_cols
+# features then label, the layout the training code slices X and y from
+training_cols = feature_cols + [target_col]
+
+# generous physical bounds, anything outside is a feed or input error, not a great round
+# rates are accepted as fractions or percentages, proximity is in feet
+value_ranges = {
+    'sg_t2g': (-30.0, 30.0),
+    'sg_total': (-30.0, 30.0),
+    'driving_dist': (-150.0, 450.0),
+    'driving_acc': (0.0, 100.0),
+    'gir': (0.0, 100.0),
+    'scrambling': (0.0, 100.0),
+    'prox_rgh': (0.0, 500.0),
+    'prox_fw': (0.0, 500.0),
+    'great_shots': (0.0, 72.0),
+    'poor_shots': (0.0, 72.0),
+}
+
+# only the feature set and label go into the hash, loosening a range doesn't invalidate a model
+schema_hash = hashlib.sha256(json.dumps({"features": feature_cols, "target": target_col}).encode()).hexdigest()[:16]
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def range_bounds(columns):
+    lower = np.array([value_ranges[col][0] for col in columns], dtype=np.float32)
+    upper = np.array([value_ranges[col][1] for col in columns], dtype=np.float32)
+    return lower, upper
+
+
+def to_float32_matrix(data, columns=feature_cols):
+    # dataframes are matched by column name, arrays and lists by position
+    # each dataframe column is written straight into the preallocated result, no df[columns] or
+    # astype copies on the way; a float32 C contiguous array comes back as is
+    if isinstance(data, pd.DataFrame):
+        missing = [col for col in columns if col not in data.columns]
+        if missing:
+            raise SchemaError(f"missing columns: {missing}")
+        not_numeric = [col for col in columns if not pd.api.types.is_numeric_dtype(data[col].dtype)]
+        if not_numeric:
+            raise SchemaError(f"non numeric columns: {not_numeric}")
+        matrix = np.empty((len(data), len(columns)), dtype=np.float32)
+        for j, col in enumerate(columns):
+            column = data[col]
+            if isinstance(column.dtype, np.dtype):
+                # a view of the column's block, cast on assignment
+                matrix[:, j] = column.to_numpy()
+            else:
+                # nullable / arrow backed columns, pd.NA becomes nan
+                matrix[:, j] = column.to_numpy(dtype=np.float32, na_value=np.nan)
+        return matrix
+
+    try:
+        matrix = np.asarray(data, dtype=np.float32, order="C")
+    except (TypeError, ValueError) as e:
+        raise SchemaError(f"rows must be numeric: {e}")
+    if matrix.ndim == 1 and matrix.shape[0] == len(columns):
+        matrix = matrix.reshape(1, -1)
+    if matrix.ndim != 2 or matrix.shape[1] != len(columns):
+        raise SchemaError(f"expected rows of {len(columns)} features, got shape {matrix.shape}")
+    return matrix
+
+
+def invalid_rows(matrix, columns=feature_cols):
+    # nan fails both comparisons, so one expression catches nan, inf and out of range values
+    lower, upper = range_bounds(columns)
+    return ~((matrix >= lower) & (matrix <= upper)).all(axis=1)
+
+
+def validate_matrix(matrix, columns=feature_cols):
+    # for inputs that must be clean as a whole (requests), raises on the first bad column
+    lower, upper = range_bounds(columns)
+    valid = (matrix >= lower) & (matrix <= upper)
+    if not valid.all():
+        bad_col = int(np.argmin(valid.all(axis=0)))
+        num_bad = int((~valid[:, bad_col]).sum())
+        raise SchemaError(f"{num_bad} row(s) with {columns[bad_col]} nan, inf or outside "
+                          f"{value_ranges[columns[bad_col]]}")
+    return matrix
+
+
+def clean_matrix(data, columns=training_cols):
+    # for training data: rows with a missing or impossible value are dropped, like dropna() was
+    matrix = to_float32_matrix(data, columns)
+    invalid = invalid_rows(matrix, columns)
+    if invalid.any():
+        matrix = matrix[~invalid]
+    return matrix, int(invalid.sum())
+
+
+def clean_frame(df, columns=model_cols):
+    # the same cleaning, kept as a dataframe for writing training data files
+    matrix, num_dropped = clean_matrix(df, columns)
+    return pd.DataFrame(matrix, columns=columns), num_dropped
+
+
+def check_model_schema(saved_hash, source):
+    # models saved before the schema hash existed are trusted, anything else has to match
+    if saved_hash is None:
+        print(f"warning: {source} has no feature schema hash, assuming {schema_hash}")
+        return
+    if saved_hash != schema_hash:
+        raise SchemaError(f"{source} was trained on feature schema {saved_hash}, "
+                          f"this code expects {schema_hash}")
@@ -0,0 +1,124 @@
+import io
+import os
+import time
+import json
+import hashlib
+import pandas as pd
+from model_cache import write_file_atomic
+
+# persistent http cache for the datagolf csv feeds, on local disk or in s3
+# the event-list feed is the whole history, re-downloaded and re-parsed every week to find a few new events
+# each entry keeps the response validators (ETag / Last-Modified) and the already parsed and filtered
+# frame, so the next run sends a conditional request and an unchanged feed costs a 304 and no parsing
+# of the full feed, just the small filtered csv
+# if the server sends no validators, a sha256 of the body still skips the parse when nothing changed
+# cache errors are never fatal, a broken or unreachable cache just means a normal download
+# an entry is two plain files, never a pickle: {name}.csv holds the frame and {name}.json the validators
+# plus the csv's sha256, written last, so a frame without matching metadata is never used
+# https://developer.mozilla.org/en-US/docs/Web/HTTP/Conditional_requests
+
+
+class LocalFeedStore:
+    # on lambda /tmp survives between warm invocations only, use S3FeedStore to keep it across cold starts
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def read(self, name):
+        path = os.path.join(self.cache_dir, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def write(self, name, data):
+        write_file_atomic(os.path.join(self.cache_dir, name), data)
+
+
+class S3FeedStore:
+    def __init__(self, s3_client, bucket, prefix="cache/datagolf/"):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def read(self, name):
+        from botocore.exceptions import ClientError
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.prefix + name)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return response["Body"].read()
+
+    def write(self, name, data):
+        self.s3_client.put_object(Bucket=self.bucket, Key=self.prefix + name, Body=data)
+
+
+class FeedCache:
+    def __init__(self, store):
+        self.store = store
+
+    def entry_name(self, path, params, variant):
+        # the api key never goes into the cache key, variant names the transform applied to the frame
+        params = {k: v for k, v in params.items() if k != "key"}
+        request = f"{path}\n{sorted(params.items())}\n{variant}"
+        return hashlib.sha256(request.encode()).hexdigest()[:32]
+
+    def get_frame(self, client, path, params, transform=None, variant=""):
+        # client is a DataGolfClient, transform(df) is applied once, on a fresh download only
+        name = self.entry_name(path, params, variant)
+        entry = self._read_entry(name)
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = client.get(path, params, headers=headers or None)
+        if response.status_code == 304 and entry is not None:
+            print(f"{path} not modified, using the cached frame")
+            return entry["frame"]
+
+        body_sha256 = hashlib.sha256(response.content).hexdigest()
+        if entry is not None and entry.get("body_sha256") == body_sha256:
+            print(f"{path} unchanged (same content hash), using the cached frame")
+            frame = entry["frame"]
+        else:
+            frame = pd.read_csv(io.StringIO(response.text))
+            if transform is not None:
+                frame = transform(frame)
+
+        self._write_entry(name, {
+            "path": path,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "body_sha256": body_sha256,
+            "stored_at": time.time(),
+        }, frame)
+        return frame.copy()
+
+    def _read_entry(self, name):
+        try:
+            meta_data = self.store.read(name + ".json")
+            if meta_data is None:
+                return None
+            entry = json.loads(meta_data)
+            frame_data = self.store.read(name + ".csv")
+            if frame_data is None or hashlib.sha256(frame_data).hexdigest() != entry.get("frame_sha256"):
+                return None
+            entry["frame"] = pd.read_csv(io.BytesIO(frame_data))
+            return entry
+        except Exception as e:
+            print("feed cache read error, downloading the full feed:", e)
+            return None
+
+    def _write_entry(self, name, entry, frame):
+        try:
+            frame_data = frame.to_csv(index=False).encode()
+            self.store.write(name + ".csv", frame_data)
+            meta = {**entry, "frame_sha256": hashlib.sha256(frame_data).hexdigest()}
+            self.store.write(name + ".json", json.dumps(meta).encode())
+        except Exception as e:
+            print("feed cache write error:", e)
@@ -6,16 +6,62 @@
 
 
 import os
+import argparse
+import tarfile
 import numpy as np
 import pandas as pd
 import joblib
 import time
 from sklearn.linear_model import SGDRegressor
 from sklearn.preprocessing import StandardScaler
+from folded_model import export_folded_model, folded_model_filename
+from feature_schema import schema_hash, check_model_schema, clean_matrix
+from training_data_io import list_training_files, read_training_file
+from minibatch_loader import iter_arrays_parallel, iter_minibatches
+from job_metrics import push_job_duration
+from model_pointer import save_model_metrics
+from training_manifest import (load_manifest, save_manifest, select_unseen_files, select_event_range,
+                               record_consumed_files)
 
 # print('test')
 
-def update_model():
+def read_clean_rows(file_path):
+    # only the 10 model columns are parsed, as float32
+    # rows with nulls or impossible values dropped (feature_schema.py), features first then the label
+    rows, _ = clean_matrix(read_training_file(file_path))
+    return rows
+
+
+def count_rows(arrays, row_counts):
+    for array in arrays:
+        row_counts.append(len(array))
+        yield array
+
+
+def unpack_model_channel(model_dir):
+    # the model channel is either the base model's files (nothing published yet) or the model.tar.gz
+    # model/latest.json points to, the previous fine tune's model and its manifest
+    tar_path = os.path.join(model_dir, 'model.tar.gz')
+    if not os.path.exists(tar_path):
+        return model_dir
+    # inside the channel folder, cleaned up with it (local_training.py removes its whole work dir)
+    unpacked_dir = os.path.join(model_dir, 'unpacked')
+    with tarfile.open(tar_path, 'r:gz') as tar:
+        tar.extractall(unpacked_dir, filter='data')
+    return unpacked_dir
+
+
+def update_model(batch_size=1024, epochs=1, workers=None, seed=42, rerun_events=None):
+    # run time goes to the pushgateway whether the fine tune finished or raised
+    job_start = time.perf_counter()
+    stats = None
+    try:
+        stats = fine_tune_model(batch_size, epochs, workers, seed, rerun_events)
+    finally:
+        push_job_duration("fine_tune", time.perf_counter() - job_start, succeeded=stats is not None, extra=stats)
+
+
+def fine_tune_model(batch_size, epochs, workers, seed, rerun_events):
     # print('run update model function')
 
     # SM_CHANNEL_MODEL is the training data that update_model points to here
@@ -26,48 +72,80 @@ def update_model():
 
     # https://discuss.huggingface.co/t/incrementally-finetuning-a-hf-model-in-sagemaker/17443/6
     # load the sagemaker model info
-    model_dir = os.environ['SM_CHANNEL_MODEL']
+    model_dir = unpack_model_channel(os.environ['SM_CHANNEL_MODEL'])
     data_dir = os.environ['SM_CHANNEL_TRAINING']
 
     model_scaler_path = os.path.join(model_dir, 'sg_t2g_model_v2.pkl')
     saved = joblib.load(model_scaler_path)
+    # fail before any training if the base model was built for another feature set
+    check_model_schema(saved.get("schema_hash"), model_scaler_path)
     model = saved["model"]
     scaler = saved["scaler"]
 
-    # pulls csvs that have been uploaded in the past 5 days
-    # ensures that only new data is used to fine tune the model
-    cutoff_timestamp = time.time() - (5 * 24 * 60 * 60)
-    training_files = []
-    for file in os.listdir(data_dir):
-        if file.endswith('.csv'):
-            full_path = os.path.join(data_dir, file)
-            #print(full_path)
-            file_mod_time = os.path.getmtime(full_path)
-            #print(file_mod_time)
-
-            if file_mod_time > cutoff_timestamp:
-                training_files.append(full_path)
-    feature_cols = ['sg_total', 'driving_dist', 'driving_acc', 'gir', 'scrambling',
-                    'prox_rgh', 'prox_fw', 'great_shots', 'poor_shots']
-    target_col = 'sg_t2g'
-
-    # cycles through csvs
-    # cleans nulls, creates feature and label columns, and fine tunes the model
-    for file_path in training_files:
-        #print(f'model {file_path}')
-        df = pd.read_csv(file_path)
-        df.dropna(inplace=True)
-        #print(df.head())
-        if df.empty:
-            continue
-        X = df[feature_cols]
-        y = df[target_col]
-        X_scaled = scaler.transform(X)
-        model.partial_fit(X_scaled, y)
+    # the manifest next to the model lists every data file it was already trained on
+    # ensures that only new data is used to fine tune the model, even if a job runs late or reruns
+    # rerun_events=(first, last) retrains on that range of event ids whatever the manifest says
+    # csv or parquet, including season= partition folders
+    manifest = load_manifest(model_dir)
+    all_files = list_training_files(data_dir)
+    if rerun_events:
+        training_files = select_event_range(all_files, *rerun_events)
+    else:
+        training_files = select_unseen_files(all_files, data_dir, manifest)
+    print(f"{len(training_files)} of {len(all_files)} data files to train on")
+
+    # files are parsed on a thread pool and regrouped into fixed size shuffled batches,
+    # one partial_fit per batch instead of one per file
+    workers = workers or os.cpu_count() or 1
+    rng = np.random.default_rng(seed)
+    row_counts = []
+    num_rows = 0
+    squared_error = 0.0
+    for epoch in range(epochs):
+        start = time.perf_counter()
+        num_rows = 0
+        num_batches = 0
+        squared_error = 0.0
+        row_counts = []
+        arrays = count_rows(iter_arrays_parallel(training_files, read_clean_rows, workers=workers,
+                                                 max_queued=2 * workers), row_counts)
+        for batch in iter_minibatches(arrays, batch_size, rng):
+            # same math as scaler.transform, done on the numpy block directly
+            X_scaled = (batch[:, :-1] - scaler.mean_) / scaler.scale_
+            # each batch is scored before the model sees it, an out of sample error for free
+            squared_error += float(((model.predict(X_scaled) - batch[:, -1]) ** 2).sum())
+            model.partial_fit(X_scaled, batch[:, -1])
+            num_rows += len(batch)
+            num_batches += 1
+        print(f"epoch {epoch + 1}/{epochs}: {num_rows} rows in {num_batches} batches "
+              f"from {len(training_files)} files, {time.perf_counter() - start:.2f}s")
 
     output_path = os.path.join(os.environ['SM_MODEL_DIR'], 'sg_t2g_model_v2.pkl')
-    joblib.dump({"model": model, "scaler": scaler}, output_path)
+    joblib.dump({"model": model, "scaler": scaler, "schema_hash": schema_hash}, output_path)
+    # numpy only copy for the server, ends up in the same model.tar.gz
+    export_folded_model(scaler, model, os.path.join(os.environ['SM_MODEL_DIR'], folded_model_filename))
+    if row_counts:
+        record_consumed_files(manifest, data_dir, training_files, row_counts)
+    save_manifest(manifest, os.environ['SM_MODEL_DIR'])
+    # goes into the model/latest.json pointer when the model is published (model_pointer.py)
+    # progressive_rmse is from the last epoch
+    progressive_rmse = float(np.sqrt(squared_error / num_rows)) if num_rows else None
+    save_model_metrics({"schema_hash": schema_hash, "files": len(training_files), "rows": sum(row_counts),
+                        "epochs": epochs, "progressive_rmse": progressive_rmse}, os.environ['SM_MODEL_DIR'])
     print("new model saved")
+    return {"files": len(training_files), "rows": sum(row_counts)}
 
 if __name__ == '__main__':
-    update_model()
+    # sagemaker passes HyperParameters to the script as --name value arguments
+    # https://sagemaker.readthedocs.io/en/stable/frameworks/sklearn/using_sklearn.html#prepare-a-scikit-learn-training-script
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    # e.g. --rerun-events 100-120
+    parser.add_argument('--rerun-events', default=None)
+    args, _ = parser.parse_known_args()
+    rerun_events = tuple(int(event_id) for event_id in args.rerun_events.split('-')) if args.rerun_events else None
+    update_model(batch_size=args.batch_size, epochs=args.epochs, workers=args.workers, seed=args.seed,
+                 rerun_events=rerun_events)
@@ -1,29 +1,55 @@
 import os
-import tarfile
-import pandas as pd
-import joblib
+import numpy as np
 from flask import Flask, request, jsonify, Response
 import boto3
-from prometheus_client import Counter, generate_latest, CONTENT_TYPE_LATEST
+from batch_predict_input import decode_batch_rows, validate_batch_rows, stream_predictions
+from folded_model import fold_scaler_into_model, load_folded_model, folded_model_filename
+from feature_schema import feature_cols, check_model_schema
+from model_cache import ModelCache, file_sha256
+from model_pointer import read_pointer, list_objects, pointer_key
+from model_watcher import ModelWatcher, extract_model_tar, local_dir_find_latest, local_dir_fetch
+from serving_metrics import (num_predictions, stage_seconds, requests_in_flight, request_errors,
+                             record_model_loaded, timed_stream, metrics_payload)
 
 s3_bucket = "paul-golf-model-and-data-bucket"
 model_prefix = "model/"
 
 # https://stackoverflow.com/questions/74556459/how-do-you-locally-load-model-tar-gz-file-from-sagemaker
 # https://docs.aws.amazon.com/sagemaker/latest/dg/cdf-training.html
-ec2_tar_path = "/app/model.tar.gz"
-extract_dir = "/app"
+extract_dir = os.environ.get("MODEL_EXTRACT_DIR", "/app")
+ec2_tar_path = os.path.join(extract_dir, "model.tar.gz")
 
 s3 = boto3.client("s3")
 
+# etag of each model key seen in the last listing, used as the cache key alongside the s3 key
+# (the sha256 from the pointer when the key came from model/latest.json)
+model_etags = {}
+# sha256 the pointer promised for each key, a download that doesn't match is refused
+model_sha256s = {}
+
+# the training path publishes model/latest.json after every successful fine tune (model_pointer.py),
+# so finding the current model is a single small GET however many jobs have run
+def get_latest_model_tar(bucket, prefix):
+    pointer = read_pointer(s3, bucket, prefix)
+    if pointer is not None:
+        # a model for another feature set is refused before it's downloaded
+        check_model_schema(pointer.get("schema_hash"), f"s3://{bucket}/{pointer_key(prefix)}")
+        model_etags[pointer['key']] = pointer['sha256']
+        model_sha256s[pointer['key']] = pointer['sha256']
+        print(f"key: {pointer['key']} (published by {pointer['job_name']})")
+        return pointer['key']
+    return list_latest_model_tar(bucket, prefix)
+
+
+# nothing published yet (models from before the pointer existed): the newest tar in a full listing
 # list everything in an s3
 # https://www.youtube.com/watch?v=ZR6adef3fCM
 # https://stackoverflow.com/questions/30249069/listing-contents-of-a-bucket-with-boto3
-def get_latest_model_tar(bucket, prefix):
-    response = s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
-    if 'Contents' not in response:
+def list_latest_model_tar(bucket, prefix):
+    objects = list_objects(s3, bucket, prefix)
+    if not objects:
         raise Exception("No objects found under prefix")
-    tar_objects = [obj for obj in response['Contents'] if obj['Key'].endswith('.tar.gz')]
+    tar_objects = [obj for obj in objects if obj['Key'].endswith('.tar.gz')]
     if not tar_objects:
         raise Exception("no model found")
 
@@ -31,71 +57,208 @@ def get_latest_model_tar(bucket, prefix):
     # https://www.radishlogic.com/aws/boto3/how-to-get-all-versions-of-a-single-object-file-in-an-aws-s3-bucket-using-python-boto3/
 
     latest_obj = max(tar_objects, key=lambda x: x['LastModified'])
+    model_etags[latest_obj['Key']] = latest_obj['ETag']
     print(f"key: {latest_obj['Key']} (last modified on: {latest_obj['LastModified']})")
     return latest_obj['Key']
 
-try:
-    s3_model_tar_path = get_latest_model_tar(s3_bucket, model_prefix)
-except Exception as e:
-    print("error:", e)
-    exit(1)
+pickled_model_name = "sg_t2g_model_v2.pkl"
+
+# MODEL_SERVING_MODE=pkl loads the scaler + SGDRegressor pickle and folds them into one numpy kernel
+# MODEL_SERVING_MODE=numpy loads the pre-folded .npz written by the training scripts,
+# so the process never imports sklearn or joblib at all
+model_serving_mode = os.environ.get("MODEL_SERVING_MODE", "pkl")
+extracted_model_name = folded_model_filename if model_serving_mode == "numpy" else pickled_model_name
+# set MODEL_LOCAL_DIR to serve from a local folder instead of s3 (local testing stand-in)
+# MODEL_POLL_SECONDS controls how often the background watcher looks for a newer model, 0 turns it off
+model_local_dir = os.environ.get("MODEL_LOCAL_DIR")
+model_poll_seconds = float(os.environ.get("MODEL_POLL_SECONDS", "300"))
+
+# extracted s3 models are cached on disk so a reboot with the same latest model skips download + extract
+model_cache = ModelCache(os.environ.get("MODEL_CACHE_DIR", os.path.join(extract_dir, "model_cache")),
+                         max_bytes=int(os.environ.get("MODEL_CACHE_MAX_BYTES", str(1024 ** 3))))
+
 
 # pull model from s3
 # https://stackoverflow.com/questions/42935034/python-boto-3-how-to-retrieve-download-files-from-aws-s3
 # https://docs.aws.amazon.com/AmazonS3/latest/userguide/download-objects.html
 # https://boto3.amazonaws.com/v1/documentation/api/latest/guide/s3-example-download-file.html
+def fetch_s3_model(s3_model_tar_path, dest_dir):
+    etag = model_etags.get(s3_model_tar_path)
+    if etag:
+        cached_dir = model_cache.get(s3_model_tar_path, etag)
+        if cached_dir and os.path.exists(os.path.join(cached_dir, extracted_model_name)):
+            print(f"loading {s3_model_tar_path} from model cache {cached_dir}")
+            return os.path.join(cached_dir, extracted_model_name)
+
+    tar_path = os.path.join(dest_dir, os.path.basename(ec2_tar_path))
+    s3.download_file(s3_bucket, s3_model_tar_path, tar_path)
+    print(f"downloaded {s3_bucket}/{s3_model_tar_path} to {tar_path}")
+    expected_sha256 = model_sha256s.get(s3_model_tar_path)
+    if expected_sha256 and file_sha256(tar_path) != expected_sha256:
+        raise Exception(f"{s3_model_tar_path} does not match the sha256 in its model pointer")
+    model_path = extract_model_tar(tar_path, dest_dir, extracted_model_name)
+    if etag:
+        artifact_paths = [os.path.join(dest_dir, name) for name in (pickled_model_name, folded_model_filename)]
+        model_cache.put(s3_model_tar_path, etag, [path for path in artifact_paths if os.path.exists(path)])
+    return model_path
+
+
+# the old server only used loaded["model"] and skipped the scaler, so predictions were on unscaled inputs
+# folding applies the scaler and the model in a single dot product
+# a model saved for a different feature schema fails here, so the watcher never swaps it in
+def load_model(model_path):
+    if model_serving_mode == "numpy":
+        return load_folded_model(model_path)
+    import joblib
+    loaded = joblib.load(model_path)
+    check_model_schema(loaded.get("schema_hash"), model_path)
+    return fold_scaler_into_model(loaded["scaler"], loaded["model"])
+
+
+def find_latest_model():
+    if model_local_dir:
+        return local_dir_find_latest(model_local_dir, extensions=(".tar.gz", os.path.splitext(extracted_model_name)[1]))
+    return get_latest_model_tar(s3_bucket, model_prefix)
+
+
+def fetch_model(version, dest_dir):
+    if model_local_dir:
+        return local_dir_fetch(model_local_dir, version, dest_dir, extracted_model_name)
+    return fetch_s3_model(version, dest_dir)
+
+def record_model_swap(previous, current):
+    # load duration and served version go to /metrics (serving_metrics.py)
+    record_model_loaded(previous, current)
+    if not model_local_dir and current.version in model_etags:
+        model_cache.mark_good(current.version, model_etags[current.version])
+
+
+watcher = ModelWatcher(find_latest_model, fetch_model, load_model,
+                       work_dir=os.path.join(extract_dir, "models"),
+                       poll_seconds=model_poll_seconds, on_swap=record_model_swap,
+                       content_token=model_etags.get)
+
+# the first load blocks, nothing can be served without a model
+# if s3 can't be reached, fall back to the last model that loaded fine on this box
 try:
-    s3.download_file(s3_bucket, s3_model_tar_path, ec2_tar_path)
-    print(f"downloaded {s3_bucket}/{s3_model_tar_path} to {ec2_tar_path}")
+    latest_model = find_latest_model()
 except Exception as e:
     print("error:", e)
-    exit(1)
+    last_good = None if model_local_dir else model_cache.last_good()
+    if last_good is None:
+        exit(1)
+    print(f"falling back to cached model {last_good['key']}")
+    model_etags[last_good["key"]] = last_good["etag"]
+    latest_model = last_good["key"]
 
-# extract tar https://www.youtube.com/watch?v=k9T_7B74Kko
 try:
-    with tarfile.open(ec2_tar_path, "r:gz") as tar:
-        tar.extractall(path=extract_dir)
+    watcher.load_version(latest_model)
 except Exception as e:
     print("error:", e)
     exit(1)
 
-extracted_model_path = os.path.join(extract_dir, "sg_t2g_model_v2.pkl")
 
-try:
-    loaded = joblib.load(extracted_model_path)
-    model = loaded["model"]
-except Exception as e:
-    print("error:", e)
-    exit(1)
+
+# the pre-forked server (serve_production.py) loads the model once in the master before forking,
+# and starts the watcher in each worker after the fork, since threads don't survive fork()
+def start_background_tasks(work_dir=None):
+    if work_dir:
+        watcher.work_dir = work_dir
+    watcher.start()
+
+
+if os.environ.get("PREFORK_SERVER") != "1":
+    start_background_tasks()
 
 app = Flask(__name__)
 
-num_predictions = Counter('predictions_counter', 'Prediction requests', ['endpoint'])
 
+@app.before_request
+def track_request_start():
+    requests_in_flight.inc()
+
+
+# teardown_request runs before a streamed /predict/batch body is sent, the response's close doesn't
+# https://flask.palletsprojects.com/en/stable/api/#flask.Response.call_on_close
+@app.after_request
+def track_request_end(response):
+    response.call_on_close(requests_in_flight.dec)
+    return response
+
+
+# each stage is timed into request_stage_seconds{endpoint, stage}
+# failures are counted in request_errors{endpoint, cause}
 @app.route("/predict", methods=["POST"])
 def predict():
+    endpoint = "/predict"
     try:
-        input_data = request.get_json()
-        if not isinstance(input_data, list) or len(input_data) != 9:
-            return jsonify({"error": "input error"}), 400
+        with stage_seconds.labels(endpoint=endpoint, stage="parse").time():
+            input_data = request.get_json()
+    except Exception as e:
+        request_errors.labels(endpoint=endpoint, cause="parse").inc()
+        return jsonify({"error": str(e)}), 400
 
-        expected_columns = [
-            "sg_total", "driving_dist", "driving_acc", "gir", "scrambling",
-            "prox_rgh", "prox_fw", "great_shots", "poor_shots"
-        ]
-        df = pd.DataFrame([input_data], columns=expected_columns)
-        prediction = model.predict(df)
+    try:
+        with stage_seconds.labels(endpoint=endpoint, stage="validate").time():
+            if not isinstance(input_data, list) or len(input_data) != len(feature_cols):
+                raise ValueError("input error")
+            # values in feature_schema.feature_cols order
+            row = validate_batch_rows(np.asarray([input_data], dtype=np.float32))
+    except Exception as e:
+        request_errors.labels(endpoint=endpoint, cause="validate").inc()
+        return jsonify({"error": str(e)}), 400
 
-        num_predictions.labels(endpoint="/predict").inc()
+    try:
+        with stage_seconds.labels(endpoint=endpoint, stage="predict").time():
+            prediction = watcher.current.model.predict(row)
+    except Exception as e:
+        request_errors.labels(endpoint=endpoint, cause="predict").inc()
+        return jsonify({"error": str(e)}), 500
+
+    num_predictions.labels(endpoint=endpoint).inc()
 
+    with stage_seconds.labels(endpoint=endpoint, stage="serialize").time():
         return jsonify({"predicted sg_t2g": prediction.tolist()})
+
+# scores a whole field of players in one round trip
+# body can be json rows, csv, or raw float32 (see batch_predict_input.py)
+# https://flask.palletsprojects.com/en/stable/patterns/streaming/
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    endpoint = "/predict/batch"
+    try:
+        with stage_seconds.labels(endpoint=endpoint, stage="parse").time():
+            rows = decode_batch_rows(request.get_data(), request.content_type)
     except Exception as e:
+        request_errors.labels(endpoint=endpoint, cause="parse").inc()
         return jsonify({"error": str(e)}), 400
 
+    try:
+        with stage_seconds.labels(endpoint=endpoint, stage="validate").time():
+            rows = validate_batch_rows(rows)
+    except Exception as e:
+        request_errors.labels(endpoint=endpoint, cause="validate").inc()
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        with stage_seconds.labels(endpoint=endpoint, stage="predict").time():
+            predictions = watcher.current.model.predict(rows)
+    except Exception as e:
+        request_errors.labels(endpoint=endpoint, cause="predict").inc()
+        return jsonify({"error": str(e)}), 500
+
+    num_predictions.labels(endpoint=endpoint).inc(len(rows))
+
+    if request.accept_mimetypes.best == "text/csv":
+        return Response(timed_stream(stream_predictions(predictions, "csv"), endpoint), mimetype="text/csv")
+    return Response(timed_stream(stream_predictions(predictions, "json"), endpoint), mimetype="application/json")
+
 
+# aggregates all worker processes when PROMETHEUS_MULTIPROC_DIR is set
 @app.route("/metrics")
 def metrics():
-    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+    payload, content_type = metrics_payload()
+    return Response(payload, mimetype=content_type)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,45 @@
+import numpy as np
+from feature_schema import feature_cols, schema_hash, check_model_schema, SchemaError
+
+# the saved model is a StandardScaler followed by a linear SGDRegressor
+# model(x) = w . ((x - mean) / scale) + b = (w / scale) . x + (b - (w / scale) . mean)
+# so both fold into one coefficient vector and intercept, and serving only needs a numpy dot product
+# https://scikit-learn.org/stable/modules/generated/sklearn.preprocessing.StandardScaler.html
+# the npz also stores the feature schema hash (feature_schema.py), checked when it's loaded
+
+folded_model_filename = "sg_t2g_model_v2.npz"
+
+
+class FoldedModel:
+    def __init__(self, coef, intercept):
+        self.coef = np.ascontiguousarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        # check_model_schema has passed by the time a FoldedModel exists
+        self.schema_hash = schema_hash
+        if self.coef.shape != (len(feature_cols),):
+            raise SchemaError(f"model has {self.coef.shape[0]} coefficients, the schema has {len(feature_cols)} features")
+
+    def predict(self, X):
+        # float32 rows from feature_schema, the dot product accumulates in float64
+        return np.asarray(X) @ self.coef + self.intercept
+
+
+def fold_scaler_into_model(scaler, model):
+    coef = np.asarray(model.coef_, dtype=np.float64) / scaler.scale_
+    intercept = float(np.ravel(model.intercept_)[0] - coef @ scaler.mean_)
+    return FoldedModel(coef, intercept)
+
+
+def export_folded_model(scaler, model, path):
+    folded = fold_scaler_into_model(scaler, model)
+    # https://numpy.org/doc/stable/reference/generated/numpy.savez.html
+    with open(path, "wb") as f:
+        np.savez(f, coef=folded.coef, intercept=np.array([folded.intercept]), schema_hash=np.array(schema_hash))
+    return folded
+
+
+def load_folded_model(path):
+    with np.load(path) as saved:
+        saved_hash = str(saved["schema_hash"]) if "schema_hash" in saved.files else None
+        check_model_schema(saved_hash, path)
+        return FoldedModel(saved["coef"], saved["intercept"][0])
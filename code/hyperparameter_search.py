@@ -0,0 +1,225 @@
+# full retrain with a hyperparameter search, the alternative to train_initial_model_bulk_data.py's one fixed
+# SGDRegressor(max_iter=1000, tol=1e-3)
+#
+# a grid (or a random sample of it) over loss, penalty, alpha, learning_rate and eta0 is scored with
+# time based cross validation: rows are sorted by event date and split into num_folds + 1 blocks of whole
+# event dates, fold k trains on blocks 0..k and validates on block k + 1, so a model is only ever scored on
+# events after the ones it was trained on, the way fine tuning uses it
+#
+# the float64 matrix is written once to a .npy file and every worker of the process pool opens it with
+# mmap_mode="r": one copy in the page cache, shared by all of them, instead of one pickled copy per worker.
+# rows sorted by date make every fold's train / validation set a contiguous slice of it
+# each fold has its own scaler fitted on that fold's training rows only, so no statistic from a later
+# event reaches the fold's score; the scaler the final model ships with is fitted on every row
+#
+# the best candidate is refit on every row and saved like train_initial (pkl {"model", "scaler",
+# "schema_hash"} + the folded npz), with a leaderboard csv of every candidate next to it
+#
+# data is a folder of {event_id}_{date}.csv / .parquet files (the s3 data/ folder, synced), or one file
+# with a date column
+# python hyperparameter_search.py --data data/ --model sg_t2g_model_v2.pkl --workers 8
+# python hyperparameter_search.py --data rounds.csv --date-column year --search random --num-candidates 40
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+from feature_schema import training_cols, model_cols, clean_matrix, to_float32_matrix, invalid_rows
+from training_data_io import list_training_files, read_training_file
+from train_initial_model_bulk_data import save_model
+
+search_space = {
+    "loss": ["squared_error", "huber", "epsilon_insensitive"],
+    "penalty": ["l2", "l1", "elasticnet"],
+    "alpha": [1e-5, 1e-4, 1e-3, 1e-2],
+    "learning_rate": ["invscaling", "constant", "adaptive"],
+    "eta0": [0.001, 0.01, 0.1],
+}
+
+
+def event_date_from_path(path):
+    # data files are named {event_id}_{date}.csv / .parquet
+    return pd.Timestamp(os.path.splitext(os.path.basename(path))[0].split("_", 1)[1])
+
+
+def load_dated_rows(data_path, date_column=None):
+    # float32 rows (features then label) and the event date of each row, oldest first
+    if os.path.isdir(data_path):
+        blocks, dates = [], []
+        for path in list_training_files(data_path):
+            rows, _ = clean_matrix(read_training_file(path))
+            blocks.append(rows)
+            dates.append(np.full(len(rows), event_date_from_path(path).to_datetime64()))
+        rows = np.concatenate(blocks) if blocks else np.empty((0, len(training_cols)), dtype=np.float32)
+        dates = np.concatenate(dates) if dates else np.empty(0, dtype="datetime64[ns]")
+    else:
+        if not date_column:
+            raise ValueError("a single data file needs --date-column")
+        df = pd.read_csv(data_path, usecols=model_cols + [date_column]) if data_path.endswith(".csv") \
+            else pd.read_parquet(data_path, columns=model_cols + [date_column])
+        rows = to_float32_matrix(df, training_cols)
+        if pd.api.types.is_numeric_dtype(df[date_column].dtype):
+            # a season / year column
+            dates = pd.to_datetime(df[date_column].astype(int).astype(str), format="%Y").to_numpy()
+        else:
+            dates = pd.to_datetime(df[date_column]).to_numpy()
+        valid = ~invalid_rows(rows, training_cols) & ~pd.isna(dates)
+        rows, dates = rows[valid], dates[valid]
+
+    # stable, so rows of one event keep their file order
+    order = np.argsort(dates, kind="stable")
+    return rows[order], dates[order]
+
+
+def time_series_folds(dates, num_folds):
+    # (train_end, valid_end) row indices into the date sorted rows: train on [0, train_end),
+    # validate on [train_end, valid_end). folds only split between event dates
+    unique_dates = np.unique(dates)
+    if len(unique_dates) < num_folds + 1:
+        raise ValueError(f"{len(unique_dates)} event dates is not enough for {num_folds} folds")
+    blocks = np.array_split(unique_dates, num_folds + 1)
+    block_ends = [int(np.searchsorted(dates, block[-1], side="right")) for block in blocks]
+    return [(block_ends[k], block_ends[k + 1]) for k in range(num_folds)]
+
+
+def make_candidates(search="grid", num_candidates=None, seed=42, space=None):
+    space = space or search_space
+    names = list(space)
+    candidates = [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    if search == "random" and num_candidates and num_candidates < len(candidates):
+        rng = np.random.default_rng(seed)
+        candidates = [candidates[i] for i in sorted(rng.choice(len(candidates), num_candidates, replace=False))]
+    return candidates
+
+
+# set in each worker process by open_shared_matrix
+shared = {}
+
+
+def open_shared_matrix(X_path, y_path):
+    shared["X"] = np.load(X_path, mmap_mode="r")
+    shared["y"] = np.load(y_path, mmap_mode="r")
+
+
+def fit_fold_scalers(X, folds):
+    # one scaler per fold, from that fold's training rows, shared by every candidate
+    return [StandardScaler().fit(X[:train_end]) for train_end, _ in folds]
+
+
+def score_candidate(candidate_id, params, folds, fold_scalers, max_iter, tol, random_state):
+    # every fold of one candidate, runs in a worker against the memory mapped matrix
+    X, y = shared["X"], shared["y"]
+    fold_rmse = []
+    start = time.perf_counter()
+    for (train_end, valid_end), scaler in zip(folds, fold_scalers):
+        model = SGDRegressor(max_iter=max_iter, tol=tol, random_state=random_state, **params)
+        with warnings.catch_warnings(), np.errstate(all="ignore"):
+            # ConvergenceWarning and overflow from the settings that diverge, they just score badly
+            warnings.simplefilter("ignore")
+            try:
+                model.fit(scaler.transform(X[:train_end]), y[:train_end])
+                predictions = model.predict(scaler.transform(X[train_end:valid_end]))
+                rmse = float(np.sqrt(np.mean((predictions - y[train_end:valid_end]) ** 2)))
+            except (ValueError, FloatingPointError):
+                rmse = float("inf")
+        fold_rmse.append(rmse if np.isfinite(rmse) else float("inf"))
+    return {"candidate": candidate_id, **params, "mean_rmse": float(np.mean(fold_rmse)),
+            "std_rmse": float(np.std(fold_rmse)) if np.isfinite(fold_rmse).all() else float("inf"),
+            "fold_rmse": fold_rmse, "seconds": time.perf_counter() - start}
+
+
+def run_search(data_path, model_path, search="grid", num_candidates=None, num_folds=4, workers=None,
+               max_iter=1000, tol=1e-3, random_state=42, date_column=None, space=None, work_dir=None):
+    space = space or search_space
+    job_start = time.perf_counter()
+    rows, dates = load_dated_rows(data_path, date_column)
+    folds = time_series_folds(dates, num_folds)
+    candidates = make_candidates(search, num_candidates, random_state, space)
+    workers = workers or os.cpu_count() or 1
+    print(f"{len(rows)} rows from {len(np.unique(dates))} event dates, {len(candidates)} candidates x "
+          f"{num_folds} folds on {workers} processes")
+
+    # SGDRegressor keeps its weights in float64, the shared matrix is float64 so no worker converts it
+    X = rows[:, :-1].astype(np.float64)
+    y = rows[:, -1].astype(np.float64)
+    del rows
+    fold_scalers = fit_fold_scalers(X, folds)
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix="hyperparameter-search-")
+    os.makedirs(work_dir, exist_ok=True)
+    X_path, y_path = os.path.join(work_dir, "X.npy"), os.path.join(work_dir, "y.npy")
+    try:
+        np.save(X_path, X)
+        np.save(y_path, y)
+        del X, y
+        open_shared_matrix(X_path, y_path)
+
+        # https://docs.python.org/3/library/concurrent.futures.html#processpoolexecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=open_shared_matrix,
+                                 initargs=(X_path, y_path)) as executor:
+            futures = [executor.submit(score_candidate, candidate_id, params, folds, fold_scalers, max_iter, tol,
+                                       random_state)
+                       for candidate_id, params in enumerate(candidates)]
+            results = []
+            for future in futures:
+                results.append(future.result())
+                if len(results) % max(1, len(candidates) // 10) == 0:
+                    print(f"{len(results)}/{len(candidates)} candidates scored")
+
+        leaderboard = pd.DataFrame(results).sort_values(["mean_rmse", "std_rmse", "candidate"]).reset_index(drop=True)
+        leaderboard.insert(0, "rank", np.arange(1, len(leaderboard) + 1))
+        best = leaderboard.iloc[0]
+        if not np.isfinite(best["mean_rmse"]):
+            raise ValueError("every candidate diverged")
+        best_params = {name: best[name] for name in space}
+        best_params["alpha"] = float(best_params["alpha"])
+        best_params["eta0"] = float(best_params["eta0"])
+
+        # refit on every row with the winning settings, saved in the same format train_initial writes
+        start = time.perf_counter()
+        scaler = StandardScaler()
+        model = SGDRegressor(max_iter=max_iter, tol=tol, random_state=random_state, **best_params)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            model.fit(scaler.fit_transform(shared["X"]), shared["y"])
+        print(f"refit on all {len(shared['y'])} rows in {time.perf_counter() - start:.1f}s: {best_params}")
+    finally:
+        # the memory maps have to be closed before their files go
+        shared.clear()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
+    save_model(scaler, model, model_path)
+    leaderboard_path = os.path.splitext(model_path)[0] + ".leaderboard.csv"
+    leaderboard.to_csv(leaderboard_path, index=False)
+    print(f"Leaderboard saved to {leaderboard_path}")
+    print(leaderboard.head(10)[["rank", *space, "mean_rmse", "std_rmse"]].to_string(index=False))
+    print(f"search done in {time.perf_counter() - job_start:.1f}s")
+    return {"best_params": best_params, "best_rmse": float(best["mean_rmse"]), "leaderboard": leaderboard}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", required=True, help="folder of {event_id}_{date} files, or one file")
+    parser.add_argument("--model", default="sg_t2g_model_v2.pkl")
+    parser.add_argument("--date-column", default=None, help="event date (or year) column of a single data file")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--num-candidates", type=int, default=30, help="random search sample size")
+    parser.add_argument("--folds", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-iter", type=int, default=1000)
+    parser.add_argument("--tol", type=float, default=1e-3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    run_search(args.data, args.model, search=args.search, num_candidates=args.num_candidates, num_folds=args.folds,
+               workers=args.workers, max_iter=args.max_iter, tol=args.tol, random_state=args.seed,
+               date_column=args.date_column)
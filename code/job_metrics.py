@@ -0,0 +1,26 @@
+import os
+import time
+
+# push durations of batch jobs (ingestion lambda, fine tuning) to a prometheus pushgateway
+# they don't live long enough to be scraped, so they push once at the end instead
+# no-op unless PUSHGATEWAY_URL is set, and prometheus_client is only imported when it is
+# https://prometheus.github.io/client_python/exporting/pushgateway/
+
+pushgateway_url = os.environ.get("PUSHGATEWAY_URL")
+
+
+def push_job_duration(job, seconds, succeeded=True, extra=None):
+    if not pushgateway_url:
+        return
+    try:
+        from prometheus_client import CollectorRegistry, Gauge, push_to_gateway
+        registry = CollectorRegistry()
+        Gauge('job_duration_seconds', 'Wall time of the last run', registry=registry).set(seconds)
+        Gauge('job_succeeded', '1 if the last run succeeded', registry=registry).set(1 if succeeded else 0)
+        Gauge('job_last_run_unixtime', 'When the last run finished', registry=registry).set(time.time())
+        for name, value in (extra or {}).items():
+            Gauge(f'job_{name}', name.replace('_', ' '), registry=registry).set(value)
+        push_to_gateway(pushgateway_url, job=job, registry=registry, timeout=5)
+    except Exception as e:
+        # metrics must never fail the job itself
+        print("pushgateway error:", e)
@@ -3,11 +3,41 @@
 # spins up sagemaker training instance
 # fine tunes the model using fine_tune.py on the sg instance
 # sg cleans data, fine tunes model then saves the fine tuned model to the model folder in s3
+#
+# small updates skip sagemaker: when the new data is at most LOCAL_TRAINING_MAX_BYTES, fine_tune runs
+# right here in the lambda (local_training.py) with the same channels and the same model.tar.gz output,
+# so the model refreshes in seconds instead of minutes. anything bigger, or a local run that fails,
+# goes to the sagemaker job as before. the lambda package then needs fine_tune.py and its deps
+# (sklearn, joblib, pandas) and enough memory / /tmp for the data
+# TRAINING_MODE=auto (default) | local | sagemaker
+#
+# every finished fine tune is published as model/latest.json (model_pointer.py), which is what the server
+# loads. local runs publish themselves; for sagemaker jobs this lambda is also subscribed to
+# s3:ObjectCreated on model/ with the suffix output/model.tar.gz, the object a job writes only once it
+# succeeded, and publishes it from here. after publishing, job folders past the newest
+# MODEL_RETENTION_COUNT (default 10, 0 keeps everything) are deleted, never the one the pointer names
+# only new training files under data/ start a fine tune, every other key (the pointer, metrics, cache
+# objects) is ignored
 
+import os
 import boto3
 import time
+from urllib.parse import unquote_plus
+from training_file_types import training_file_content_type, training_file_extensions
+from local_training import channel_size, run_local_training, split_s3_uri
+from model_pointer import publish_model, read_pointer, collect_old_models, latest_model_uri
 
 sagemaker = boto3.client('sagemaker')
+s3 = boto3.client('s3')
+
+training_mode = os.environ.get('TRAINING_MODE', 'auto')
+local_training_max_bytes = int(os.environ.get('LOCAL_TRAINING_MAX_BYTES', str(20 * 1024 * 1024)))
+model_retention_count = int(os.environ.get('MODEL_RETENTION_COUNT', '10'))
+
+model_uri = 's3://paul-golf-model-and-data-bucket/model'
+# only new files under here start a fine tune
+training_data_prefix = 'data/'
+output_uri = 's3://paul-golf-model-and-data-bucket/model/'
 
 
 def lambda_handler(event, context):
@@ -15,8 +45,76 @@ def lambda_handler(event, context):
     # https://stackoverflow.com/questions/53891128/how-to-get-s3-bucket-name-and-key-of-a-file-from-an-event-in-lambda
 
     bucket_name = event['Records'][0]['s3']['bucket']['name']
-    uploaded_file_key = event['Records'][0]['s3']['object']['key']
+    # keys arrive url encoded, data/season%3D2025/... for the parquet partition folders
+    uploaded_file_key = unquote_plus(event['Records'][0]['s3']['object']['key'])
+
+    output_prefix = split_s3_uri(output_uri)[1]
+    if uploaded_file_key.startswith(output_prefix) and uploaded_file_key.endswith('/output/model.tar.gz'):
+        return publish_finished_job(bucket_name, uploaded_file_key)
+
+    # the pointer, metrics, cache files or anything else written to the bucket is not training data
+    is_training_data = uploaded_file_key.endswith(training_file_extensions)
+    if not (uploaded_file_key.startswith(training_data_prefix) and is_training_data):
+        print(f"{uploaded_file_key} is not a training data file, nothing to do")
+        return {'statusCode': 200, 'body': f"ignored: {uploaded_file_key}"}
+
+    # continue from the published model, whose manifest lists the data it was already trained on
+    model_channel_uri = latest_model_uri(s3, *split_s3_uri(output_uri), model_uri)
+
+    if training_mode != 'sagemaker':
+        training_bytes = channel_size(s3, bucket_name, uploaded_file_key)
+        if training_mode == 'local' or training_bytes <= local_training_max_bytes:
+            try:
+                result = run_local_training(s3, f's3://{bucket_name}/{uploaded_file_key}', model_channel_uri,
+                                            output_uri, f"fine-tune-local-{int(time.time())}")
+                remove_old_models(result['pointer'])
+                return {
+                    'statusCode': 200,
+                    'body': f"local fine tune done: {result['output_uri']}"
+                }
+            except Exception as e:
+                print("local fine tune failed, starting a sagemaker job instead:", e)
+        else:
+            print(f"{training_bytes} bytes of new data is over {local_training_max_bytes}, using sagemaker")
+
+    return start_training_job(bucket_name, uploaded_file_key, model_channel_uri)
+
+
+def publish_finished_job(bucket_name, model_key):
+    # model/{job_name}/output/model.tar.gz
+    output_bucket, output_prefix = split_s3_uri(output_uri)
+    current = read_pointer(s3, output_bucket, output_prefix)
+    if current is not None and current['key'] == model_key:
+        # a local run's upload, already published by run_local_training
+        return {'statusCode': 200, 'body': f"already published: {model_key}"}
+
+    # a job that finished after one started later is not published (publish_model compares start times),
+    # or a late event would roll the pointer back and retention could then delete the newer model
+    job_name = model_key[len(output_prefix):].split('/')[0]
+    tar_path = f"/tmp/{job_name}.model.tar.gz"
+    s3.download_file(bucket_name, model_key, tar_path)
+    try:
+        pointer, published = publish_model(s3, output_bucket, output_prefix, model_key, tar_path, job_name)
+    finally:
+        os.remove(tar_path)
+    if not published:
+        return {'statusCode': 200, 'body': f"not published: {model_key}, current model is {pointer['key']}"}
+    remove_old_models(pointer)
+    return {'statusCode': 200, 'body': f"published: {model_key}"}
+
+
+def remove_old_models(pointer):
+    # retention is best effort, a failed cleanup never fails the fine tune
+    if model_retention_count <= 0:
+        return
+    try:
+        collect_old_models(s3, *split_s3_uri(output_uri), keep=model_retention_count,
+                           protected_keys=[pointer['key']])
+    except Exception as e:
+        print("error removing old models:", e)
+
 
+def start_training_job(bucket_name, uploaded_file_key, model_channel_uri=model_uri):
     # https://docs.aws.amazon.com/sagemaker/latest/dg/pre-built-docker-containers-scikit-learn-spark.html
     training_image = '683313688378.dkr.ecr.us-east-1.amazonaws.com/sagemaker-scikit-learn:1.2-1-cpu-py3'
 
@@ -47,14 +145,14 @@ def lambda_handler(event, context):
                         'S3DataDistributionType': 'FullyReplicated',
                     }
                 },
-                'ContentType': 'text/csv',
+                'ContentType': training_file_content_type(uploaded_file_key),
                 'InputMode': 'File'
             },
             {
                 'ChannelName': 'model',
                 'DataSource': {
                     'S3DataSource': {
-                        'S3Uri': 's3://paul-golf-model-and-data-bucket/model',
+                        'S3Uri': model_channel_uri,
                         'S3DataType': 'S3Prefix',
                         'S3DataDistributionType': 'FullyReplicated',
                     }
@@ -64,7 +162,7 @@ def lambda_handler(event, context):
             }
         ],
         OutputDataConfig={
-            'S3OutputPath': 's3://paul-golf-model-and-data-bucket/model/'
+            'S3OutputPath': output_uri
         },
         ResourceConfig={
             'InstanceType': 'ml.m5.large',
@@ -1,73 +1,152 @@
 # pulls the eventlist data from the eventlist api.
 # filters down to just pga tour with sg and traditional stats
-# checks whether each round already exists in the eventlist table
+# checks which events already exist in the eventlist table (one query + anti-join)
 # if not, adds the list then calls the player_round api to pull the data for that tournament
-# adds the tournament to the player_round_stats table
-# saves a csv with the new tournament dat to the s3 bucket
+# bulk loads the tournament rounds into the player_round_stats table, one transaction per event
+# saves a csv (or parquet, DATA_FORMAT=parquet) with the new tournament dat to the s3 bucket
+# the rounds downloads and s3 uploads for new events run in parallel (INGEST_WORKERS threads)
+# the filtered event list is cached with its ETag / Last-Modified (feed_cache.py), in s3 under
+# FEED_CACHE_S3_PREFIX or on disk in FEED_CACHE_DIR, so an unchanged feed is a 304 and no csv parsing
+# off unless one of them is set; an s3 prefix must not be one the update-model lambda is triggered on
 
 
 import os
-import io
-import requests
+import time
 import pymysql
 import pandas as pd
 import boto3
-
-s3_client = boto3.client('s3')
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datagolf_client import DataGolfClient
+from feed_cache import FeedCache, LocalFeedStore, S3FeedStore
+from eventlist_db import fetch_existing_event_keys, find_new_events, insert_events
+from round_stats_loader import load_event_rounds
+from training_data_io import serialize_training_frame, training_data_key
+from feature_schema import clean_frame
+from job_metrics import push_job_duration
+
+ingest_workers = int(os.environ.get('INGEST_WORKERS', '8'))
+events_start_date = os.environ.get('EVENTS_START_DATE', '2025-02-24')
+data_format = os.environ.get('DATA_FORMAT', 'csv')
+
+# S3_ENDPOINT_URL lets the handler run against a local s3 stand-in (moto server, minio)
+# https://boto3.amazonaws.com/v1/documentation/api/latest/guide/configuration.html
+s3_client = boto3.client('s3', endpoint_url=os.environ.get('S3_ENDPOINT_URL'),
+                         config=Config(max_pool_connections=max(10, ingest_workers)))
 s3_bucket = os.environ.get('S3_BUCKET')
 
+feed_cache_dir = os.environ.get('FEED_CACHE_DIR')
+feed_cache_s3_prefix = os.environ.get('FEED_CACHE_S3_PREFIX', '')
+
+
+def make_feed_cache():
+    if feed_cache_dir:
+        return FeedCache(LocalFeedStore(feed_cache_dir))
+    if feed_cache_s3_prefix and s3_bucket:
+        return FeedCache(S3FeedStore(s3_client, s3_bucket, feed_cache_s3_prefix))
+    return None
+
+
+def filter_pga_sg_events(event_df):
+    # only pga tournaments with sg and traditional stats
+    return event_df[
+        (event_df["tour"].str.lower() == "pga") &
+        (event_df["sg_categories"].str.lower() == "yes") &
+        (event_df["traditional_stats"].str.lower() == "yes")
+        ]
+
+
+def ingest_event_rounds(client, event_info):
+    # player-round stats api call, then a csv of the model columns to the s3 data/ folder
+    # runs on a worker thread, so it only touches the http client and s3, never the db cursor
+    # returns (rounds_df, uploaded), rounds_df is None when the download failed
+    event_id = event_info['event_id']
+    date = event_info['date']
+    try:
+        rounds_df = client.get_rounds(event_info['tour'], event_id, event_info['calendar_year'])
+    except Exception as e:
+        print(f"player_round stats error for event={event_id}:", e)
+        return None, False
+
+    # model columns as float32, rows with nulls or impossible values dropped (feature_schema.py)
+    cleaned_df_for_s3, num_dropped = clean_frame(rounds_df)
+    if num_dropped:
+        print(f"event={event_id}: dropped {num_dropped} rows failing the feature schema")
+
+    # https://stackoverflow.com/questions/38154040/save-dataframe-to-csv-directly-to-s3-python
+    # DATA_FORMAT=parquet writes typed float32 parquet partitioned by season instead of csv
+    season = event_info['calendar_year']
+    if 'season' in rounds_df and rounds_df['season'].notna().any():
+        season = int(rounds_df['season'].dropna().iloc[0])
+    s3_bucket_path_and_filename = training_data_key(event_id, date, season, data_format)
+
+    try:
+        s3_client.put_object(Bucket=s3_bucket, Key=s3_bucket_path_and_filename,
+                             Body=serialize_training_frame(cleaned_df_for_s3, data_format))
+    except Exception as e:
+        print(f"error with s3 csv upload for event={event_id}:", e)
+        return rounds_df, False
+
+    return rounds_df, True
+
+
+def connect_db():
+    return pymysql.connect(
+        host=os.environ.get('RDS_HOST'),
+        user=os.environ.get('RDS_USER'),
+        password=os.environ.get('RDS_PASSWORD'),
+        db=os.environ.get('RDS_DB_NAME'),
+        connect_timeout=5,
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
 
 def lambda_handler(event, context):
+    # run time goes to the pushgateway when PUSHGATEWAY_URL is set
+    start = time.perf_counter()
+    result = None
+    try:
+        result = update_events(event, context)
+        return result
+    finally:
+        # a raise is pushed as a failed run too
+        push_job_duration("get_and_update_events", time.perf_counter() - start,
+                          succeeded=result is not None and result["statusCode"] == 200)
+
+
+def update_events(event, context):
     api_key = os.environ.get('API_KEY')
-    db_host = os.environ.get('RDS_HOST')
-    db_user = os.environ.get('RDS_USER')
-    db_password = os.environ.get('RDS_PASSWORD')
-    db_name = os.environ.get('RDS_DB_NAME')
 
     if not api_key:
         return {"statusCode": 500, "body": "api key error"}
 
-    eventlist_api = f"https://feeds.datagolf.com/historical-raw-data/event-list?file_format=csv&key={api_key}"
+    client = DataGolfClient(api_key, pool_size=ingest_workers)
     try:
-        response = requests.get(eventlist_api)
-        # https://www.geeksforgeeks.org/response-raise_for_status-python-requests/#
-        response.raise_for_status()
-        # https://andrewpwheeler.com/2022/11/02/using-io-objects-in-python-to-read-data/
-        event_df = pd.read_csv(io.StringIO(response.text))
+        # only pga tournaments with sg and traditional stats, the filter runs once per feed change
+        event_df = client.get_event_list(feed_cache=make_feed_cache(), transform=filter_pga_sg_events,
+                                         variant="pga_sg_traditional")
 
     except Exception as e:
         print("eventlist error:", e)
         return {"statusCode": 500, "body": f"error: {e}"}
 
-    # only pga tournaments with sg and traditional stats
-    event_df = event_df[
-        (event_df["tour"].str.lower() == "pga") &
-        (event_df["sg_categories"].str.lower() == "yes") &
-        (event_df["traditional_stats"].str.lower() == "yes")
-        ]
-
     ###########################################################################################
     ###########################################################################################
     # necking down to just pulling in tournaments after feb 24, 2025 for testing
     # loading all old data into the micro rds instance was taking too long
+    # the rounds now go in through the bulk loader, so EVENTS_START_DATE can be moved back
+    # to pull in older history; for the full history use backfill_events.py, which is resumable
     ###########################################################################################
     ###########################################################################################
 
     event_df["date"] = pd.to_datetime(event_df["date"])
-    event_df = event_df[event_df["date"] > pd.Timestamp("2025-02-24")]
+    event_df = event_df[event_df["date"] > pd.Timestamp(events_start_date)]
 
     # pga tournaments with sg stats
     print(len(event_df))
 
     try:
-        connection = pymysql.connect(
-            host=db_host,
-            user=db_user,
-            password=db_password,
-            db=db_name,
-            connect_timeout=5,
-            cursorclass=pymysql.cursors.DictCursor
-        )
+        connection = connect_db()
     except Exception as e:
         print("db connection error:", e)
         return {"statusCode": 500, "body": f"error: {e}"}
@@ -77,126 +156,30 @@ def lambda_handler(event, context):
 
     try:
         with connection.cursor() as cursor:
-            for _, event_info in event_df.iterrows():
-                event_id = event_info['event_id']
-                tour = event_info['tour']
-                calendar_year = event_info['calendar_year']
-                date = event_info['date']
-
-                event_exists_query = """
-                    SELECT COUNT(*) AS count
-                    FROM pga_with_sg_cat_eventslist
-                    WHERE event_id = %s AND tour = %s AND calendar_year = %s
-                """
-                cursor.execute(event_exists_query, (event_id, tour, calendar_year))
-                result = cursor.fetchone()
-
-                # https://dev.mysql.com/doc/connector-python/en/connector-python-example-cursor-transaction.html
-                # https://stackoverflow.com/questions/20463333/mysqldb-python-insert-d-and-s
-                # https://stackoverflow.com/questions/74064500/im-trying-to-insert-values-into-mysql-table-in-python-but-i-keep-getting-a-err
-
-                if result['count'] == 0:
-                    insert_event_query = """
-                        INSERT INTO pga_with_sg_cat_eventslist (
-                            calendar_year, date, event_id, event_name, 
-                            sg_categories, tour, traditional_stats
-                        )
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """
-                    # https://dev.mysql.com/doc/connector-python/en/connector-python-api-mysqlcursor-execute.html
-                    cursor.execute(insert_event_query, (
-                        event_info['calendar_year'],
-                        date,
-                        event_id,
-                        event_info['event_name'],
-                        event_info['sg_categories'],
-                        tour,
-                        event_info['traditional_stats']
-                    ))
-                    num_new_events += 1
-
-                    # player-round stats api call
-                    ############################################################################################
-                    ###########################################################################################
-
-                    player_rounds_stats_api = (
-                        f"https://feeds.datagolf.com/historical-raw-data/rounds"
-                        f"?tour={tour}&event_id={event_id}&year={calendar_year}"
-                        f"&file_format=csv&key={api_key}"
-                    )
-                    try:
-                        rounds_response = requests.get(player_rounds_stats_api)
-                        rounds_response.raise_for_status()
-                        rounds_df = pd.read_csv(io.StringIO(rounds_response.text))
-                    except Exception as e:
-                        print(f"player_round stats error for event={event_id}:", e)
-                        continue
-
-                    columns_to_keep_for_model = ['sg_t2g', 'sg_total', 'driving_dist', 'driving_acc',
-                                                 'gir', 'scrambling', 'prox_rgh', 'prox_fw', 'great_shots', 'poor_shots'
-                                                 ]
-                    cleaned_df_for_s3 = rounds_df[columns_to_keep_for_model].dropna()
-
-                    # https://stackoverflow.com/questions/38154040/save-dataframe-to-csv-directly-to-s3-python
-
-                    ############################################################################################
-                    ###########################################################################################
-
-                    csv_buffer = io.StringIO()
-                    cleaned_df_for_s3.to_csv(csv_buffer, index=False)
-
-                    s3_bucket_path_and_filename = f"data/{event_id}_{date}.csv"
-
-                    try:
-                        s3_client.put_object(Bucket=s3_bucket, Key=s3_bucket_path_and_filename,
-                                             Body=csv_buffer.getvalue())
-
-                    except Exception as e:
-                        print("error with s3 csv upload:", e)
-
-                # removing attempt at loading all the stats into the db. kept running into hiccups. switched to simply saving a csv to the s3 for each new event
-                # insert_round_query = """
-                #     INSERT INTO player_round_stats_pga_with_sg_data (
-                #         tour,
-                #         year,
-                #         season,
-                #         event_name,
-                #         event_id,
-                #         player_name,
-                #         dg_id,
-                #         fin_text,
-                #         round_num,
-                #         course_name,
-                #         course_num,
-                #         course_par,
-                #         start_hole,
-                #         teetime,
-                #         round_score,
-                #         sg_putt,
-                #         sg_arg,
-                #         sg_app,
-                #         sg_ott,
-                #         sg_t2g,
-                #         sg_total,
-                #         driving_dist,
-                #         driving_acc,
-                #         gir,
-                #         scrambling,
-                #         prox_rgh,
-                #         prox_fw,
-                #         great_shots,
-                #         poor_shots
-                #     )
-                #     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                # """
-                # for _, round_data in rounds_df.iterrows():
-                #     cursor.execute(insert_round_query, tuple(round_data.fillna("").values))
-                #     num_new_rounds += 1
-
-                else:
-                    pass
-
-            connection.commit()
+            # one select for the keys already stored, anti-join in pandas, one batched insert
+            # https://dev.mysql.com/doc/connector-python/en/connector-python-example-cursor-transaction.html
+            existing_keys_df = fetch_existing_event_keys(cursor, event_df["calendar_year"].unique())
+            new_events_df = find_new_events(event_df, existing_keys_df)
+            num_new_events = insert_events(cursor, new_events_df)
+            new_events = new_events_df.to_dict("records")
+        connection.commit()
+
+        # downloads run on the pool, the db load for each event runs here on the one connection
+        # https://docs.python.org/3/library/concurrent.futures.html#threadpoolexecutor-example
+        with ThreadPoolExecutor(max_workers=ingest_workers) as executor:
+            futures = {executor.submit(ingest_event_rounds, client, event_info): event_info
+                       for event_info in new_events}
+            for future in as_completed(futures):
+                event_info = futures[future]
+                # the rounds still go in when only the upload failed, the db doesn't need the data/ file
+                rounds_df, _ = future.result()
+                if rounds_df is None:
+                    continue
+                try:
+                    num_new_rounds += load_event_rounds(connection, rounds_df, event_info['tour'],
+                                                        event_info['event_id'], event_info['calendar_year'])
+                except Exception as e:
+                    print(f"error loading rounds for event={event_info['event_id']}:", e)
     except Exception as e:
         print("error updating db:", e)
         return {"statusCode": 500, "body": f"error updating db: {e}"}
@@ -0,0 +1,125 @@
+# runs fine_tune.update_model in the current process with the same inputs and outputs as the
+# sagemaker training job lambda_function_update_model.py launches
+# a weekly fine tune is one event's csv and a few partial_fit calls, milliseconds of math behind
+# minutes of container provisioning, so small updates run here (in the lambda or any shell) instead
+#
+# same contract as sagemaker:
+#   channels  the same S3Uri prefixes, downloaded to {work_dir}/input/data/{channel}/ (SM_CHANNEL_{CHANNEL})
+#   output    everything fine_tune writes to SM_MODEL_DIR, tarred and uploaded to
+#             {S3OutputPath}/{job_name}/output/model.tar.gz, then published as {S3OutputPath}latest.json
+#             (model_pointer.py), the pointer the server reads to find the current model
+# https://docs.aws.amazon.com/sagemaker/latest/dg/your-algorithms-training-algo-running-container.html
+#
+# python local_training.py --training-uri s3://paul-golf-model-and-data-bucket/data/100_2025-03-02.csv
+
+import os
+import time
+import shutil
+import tarfile
+import argparse
+import tempfile
+from model_pointer import publish_model
+
+
+def split_s3_uri(uri):
+    # s3://bucket/some/prefix -> (bucket, some/prefix)
+    bucket, _, prefix = uri[len("s3://"):].partition("/")
+    return bucket, prefix
+
+
+def list_prefix(s3_client, bucket, prefix):
+    # (key, size) of every object under the prefix, like an S3Prefix channel sees it
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/guide/paginators.html
+    objects = []
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        objects.extend((item["Key"], item["Size"]) for item in page.get("Contents", []))
+    return objects
+
+
+def channel_size(s3_client, bucket, prefix):
+    return sum(size for _, size in list_prefix(s3_client, bucket, prefix))
+
+
+def download_channel(s3_client, bucket, prefix, dest_dir, top_level_only=False):
+    # keys keep their path relative to the prefix, a key that is the whole prefix lands as its file name
+    # top_level_only skips sub folders, for the model channel fine_tune only reads the files at its root
+    # and the sub folders hold every earlier job's output. once a model is published the model channel is
+    # just its model.tar.gz (model_pointer.latest_model_uri), which fine_tune unpacks itself
+    os.makedirs(dest_dir, exist_ok=True)
+    paths = []
+    for key, _ in list_prefix(s3_client, bucket, prefix):
+        if key.endswith("/"):
+            continue
+        relative_path = key[len(prefix):].lstrip("/") or os.path.basename(key)
+        if top_level_only and "/" in relative_path:
+            continue
+        path = os.path.join(dest_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        s3_client.download_file(bucket, key, path)
+        paths.append(path)
+    return paths
+
+
+def package_model_dir(model_dir, tar_path):
+    # files at the root of the archive, the layout sagemaker gives SM_MODEL_DIR
+    with tarfile.open(tar_path, "w:gz") as tar:
+        for name in sorted(os.listdir(model_dir)):
+            tar.add(os.path.join(model_dir, name), arcname=name)
+    return tar_path
+
+
+def run_local_training(s3_client, training_uri, model_uri, output_uri, job_name, hyperparameters=None,
+                       work_dir=None):
+    # the three uris are the S3Uri / S3OutputPath values the sagemaker job would get
+    start = time.perf_counter()
+    work_dir = work_dir or tempfile.mkdtemp(prefix=f"{job_name}-")
+    training_dir = os.path.join(work_dir, "input", "data", "training")
+    model_channel_dir = os.path.join(work_dir, "input", "data", "model")
+    model_dir = os.path.join(work_dir, "model")
+    os.makedirs(model_dir, exist_ok=True)
+
+    env_names = ("SM_CHANNEL_TRAINING", "SM_CHANNEL_MODEL", "SM_MODEL_DIR")
+    previous_env = {name: os.environ.get(name) for name in env_names}
+    try:
+        download_channel(s3_client, *split_s3_uri(training_uri), training_dir)
+        download_channel(s3_client, *split_s3_uri(model_uri), model_channel_dir, top_level_only=True)
+        os.environ.update(SM_CHANNEL_TRAINING=training_dir, SM_CHANNEL_MODEL=model_channel_dir,
+                          SM_MODEL_DIR=model_dir)
+
+        # imported here so the sagemaker only path doesn't need sklearn in the lambda package
+        import fine_tune
+        fine_tune.update_model(**(hyperparameters or {}))
+
+        tar_path = package_model_dir(model_dir, os.path.join(work_dir, "model.tar.gz"))
+        output_bucket, output_prefix = split_s3_uri(output_uri)
+        output_key = f"{output_prefix.rstrip('/')}/{job_name}/output/model.tar.gz".lstrip("/")
+        s3_client.upload_file(tar_path, output_bucket, output_key)
+        # only once the upload has finished, the pointer never names a partial artifact
+        pointer, _ = publish_model(s3_client, output_bucket, output_prefix, output_key, tar_path, job_name)
+    finally:
+        for name, value in previous_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        # lambda keeps /tmp between warm invocations
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    seconds = time.perf_counter() - start
+    output_uri = f"s3://{output_bucket}/{output_key}"
+    print(f"local fine tune {job_name} uploaded {output_uri} in {seconds:.1f}s")
+    return {"job_name": job_name, "output_uri": output_uri, "seconds": seconds, "pointer": pointer}
+
+
+if __name__ == "__main__":
+    import boto3
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--training-uri", required=True, help="key or prefix of the new training data")
+    parser.add_argument("--model-uri", default="s3://paul-golf-model-and-data-bucket/model")
+    parser.add_argument("--output-uri", default="s3://paul-golf-model-and-data-bucket/model/")
+    parser.add_argument("--job-name", default=None)
+    args = parser.parse_args()
+
+    run_local_training(boto3.client("s3"), args.training_uri, args.model_uri, args.output_uri,
+                       args.job_name or f"fine-tune-local-{int(time.time())}")
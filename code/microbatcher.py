@@ -0,0 +1,86 @@
+import asyncio
+import time
+import numpy as np
+
+# coalesces concurrent single row predictions into one vectorized model call
+# each request puts its row on a queue and awaits a future; one collector task takes whatever
+# is queued (waiting at most max_wait_seconds for more once the first row arrives),
+# scores up to max_batch_size rows in a single predict, and hands each caller its own result
+
+
+class MicroBatcher:
+    def __init__(self, predict, max_batch_size=64, max_wait_seconds=0.0005, on_batch=None):
+        self.predict_fn = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        # on_batch(batch_size, queue_delays) for metrics
+        self.on_batch = on_batch
+        self._queue = None
+        self._task = None
+        # the rows _run has taken off the queue and not answered yet
+        self._batch = []
+
+    def start(self):
+        # must be called from inside the running event loop
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # nothing will score these any more, fail them so no caller waits forever
+        pending = self._batch
+        self._batch = []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("shutting down"))
+
+    async def predict(self, row):
+        if self._task is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, future, time.perf_counter()))
+        return await future
+
+    def _drain(self, batch):
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+    async def _run(self):
+        while True:
+            batch = self._batch = [await self._queue.get()]
+            self._drain(batch)
+            if len(batch) < self.max_batch_size and self.max_wait_seconds > 0:
+                # give concurrent requests a moment to join, then take whatever showed up
+                await asyncio.sleep(self.max_wait_seconds)
+                self._drain(batch)
+
+            started = time.perf_counter()
+            futures = [future for _, future, _ in batch]
+            try:
+                predictions = np.asarray(self.predict_fn(np.stack([row for row, _, _ in batch]))).tolist()
+                if len(predictions) != len(batch):
+                    raise ValueError(f"model returned {len(predictions)} predictions for {len(batch)} rows")
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                self._batch = []
+                continue
+
+            for future, prediction in zip(futures, predictions):
+                if not future.done():
+                    future.set_result(prediction)
+            self._batch = []
+            if self.on_batch:
+                self.on_batch(len(batch), [started - queued_at for _, _, queued_at in batch])
@@ -0,0 +1,85 @@
+import queue
+import threading
+import numpy as np
+
+# parallel file parsing + fixed size shuffled mini-batches for fine_tune.py
+# files are parsed on a pool of threads (the pandas csv/parquet readers release the gil),
+# and a semaphore caps how many parsed files can be waiting, so memory stays bounded
+# results come back in file order, so a run with the same files and seed is repeatable
+
+
+def iter_arrays_parallel(file_paths, read_file, workers=4, max_queued=8):
+    paths = queue.Queue()
+    for index, path in enumerate(file_paths):
+        paths.put((index, path))
+    results = queue.Queue()
+    # a worker takes a permit before parsing, the consumer gives it back once that file is yielded
+    permits = threading.Semaphore(max(max_queued, workers))
+    # set when the consumer is done, early (a read error, the generator closed) or not
+    stop = threading.Event()
+
+    def worker():
+        while True:
+            permits.acquire()
+            if stop.is_set():
+                return
+            try:
+                index, path = paths.get_nowait()
+            except queue.Empty:
+                permits.release()
+                return
+            try:
+                results.put((index, read_file(path), None))
+            except Exception as e:
+                results.put((index, None, e))
+
+    # https://docs.python.org/3/library/queue.html
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+
+    pending = {}
+    try:
+        for next_index in range(len(file_paths)):
+            while next_index not in pending:
+                index, array, error = results.get()
+                pending[index] = (array, error)
+            array, error = pending.pop(next_index)
+            permits.release()
+            if error is not None:
+                raise error
+            yield array
+    finally:
+        # one permit per worker so any blocked on acquire wakes up, sees stop and exits
+        stop.set()
+        for _ in threads:
+            permits.release()
+        for thread in threads:
+            thread.join()
+
+
+def iter_minibatches(arrays, batch_size, rng, shuffle_buffer_batches=8):
+    # regroups rows from any number of files into batch_size row batches
+    # rows are shuffled across files inside a buffer of shuffle_buffer_batches batches,
+    # so one big event doesn't dominate a step and tiny files don't cost a call each
+    buffer = []
+    buffered_rows = 0
+    for array in arrays:
+        if len(array) == 0:
+            continue
+        buffer.append(array)
+        buffered_rows += len(array)
+        if buffered_rows >= batch_size * shuffle_buffer_batches:
+            block = np.concatenate(buffer)
+            block = block[rng.permutation(len(block))]
+            num_full = len(block) // batch_size * batch_size
+            for start in range(0, num_full, batch_size):
+                yield block[start:start + batch_size]
+            buffer = [block[num_full:]]
+            buffered_rows = len(buffer[0])
+
+    if buffered_rows:
+        block = np.concatenate(buffer)
+        block = block[rng.permutation(len(block))]
+        for start in range(0, len(block), batch_size):
+            yield block[start:start + batch_size]
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+
+# on disk cache of extracted model artifacts, keyed by s3 key + etag
+# a boot that finds the same key/etag it saw last time loads straight from here,
+# skipping the download and the tar extraction
+# every file is stored with its sha256 and checked on read, corrupt entries are dropped
+# the least recently used entries are evicted once the cache grows past max_bytes
+
+meta_filename = "meta.json"
+last_good_filename = "last_good.json"
+
+
+def file_sha256(path):
+    # https://docs.python.org/3/library/hashlib.html#file-hashing
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_file_atomic(path, data):
+    # write then rename so a crash never leaves a half written file behind
+    # pid in the temp name so worker processes sharing the cache don't collide
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_json_atomic(path, data, **dump_options):
+    # also used for the training manifest and metrics files, dump_options go to json.dumps
+    write_file_atomic(path, json.dumps(data, **dump_options).encode())
+
+
+class ModelCache:
+    def __init__(self, cache_dir, max_bytes=1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_dir(self, key, etag):
+        # content addressed: s3 etag changes whenever the object bytes change
+        name = hashlib.sha256(f"{key}\n{etag}".encode()).hexdigest()[:32]
+        return os.path.join(self.cache_dir, name)
+
+    def get(self, key, etag):
+        entry_dir = self.entry_dir(key, etag)
+        meta = self._read_meta(entry_dir)
+        if meta is None:
+            return None
+        for filename, expected_sha in meta["files"].items():
+            path = os.path.join(entry_dir, filename)
+            if not os.path.exists(path) or file_sha256(path) != expected_sha:
+                print(f"model cache entry for {key} failed integrity check, removing")
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                return None
+        meta["used_at"] = time.time()
+        write_json_atomic(os.path.join(entry_dir, meta_filename), meta)
+        return entry_dir
+
+    def put(self, key, etag, file_paths):
+        entry_dir = self.entry_dir(key, etag)
+        if self._read_meta(entry_dir) is not None:
+            # same key + etag means same bytes, another worker already stored it
+            return entry_dir
+        tmp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        files = {}
+        size = 0
+        for path in file_paths:
+            filename = os.path.basename(path)
+            dest_path = os.path.join(tmp_dir, filename)
+            shutil.copyfile(path, dest_path)
+            files[filename] = file_sha256(dest_path)
+            size += os.path.getsize(dest_path)
+
+        now = time.time()
+        write_json_atomic(os.path.join(tmp_dir, meta_filename), {
+            "key": key, "etag": etag, "files": files, "size": size,
+            "stored_at": now, "used_at": now,
+        })
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # lost the race to another worker storing the same entry
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict(protect=entry_dir)
+        return entry_dir
+
+    def mark_good(self, key, etag):
+        # the last artifact that loaded and validated, used when s3 can't be reached
+        write_json_atomic(os.path.join(self.cache_dir, last_good_filename), {"key": key, "etag": etag})
+
+    def last_good(self):
+        path = os.path.join(self.cache_dir, last_good_filename)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            last_good = json.load(f)
+        if self._read_meta(self.entry_dir(last_good["key"], last_good["etag"])) is None:
+            return None
+        return last_good
+
+    def evict(self, protect=None):
+        protected = {protect}
+        last_good = self.last_good()
+        if last_good:
+            protected.add(self.entry_dir(last_good["key"], last_good["etag"]))
+
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".tmp"):
+                continue
+            entry_dir = os.path.join(self.cache_dir, name)
+            meta = self._read_meta(entry_dir)
+            if meta is not None:
+                entries.append((meta["used_at"], meta["size"], entry_dir))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if entry_dir in protected:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+    def _read_meta(self, entry_dir):
+        path = os.path.join(entry_dir, meta_filename)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except ValueError:
+            return None
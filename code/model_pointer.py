@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import tarfile
+import argparse
+from model_cache import file_sha256, write_json_atomic
+
+# model/latest.json names the model.tar.gz the server should load, so finding the current model is one
+# small GET instead of listing every job's output under model/ and taking the newest LastModified
+# (slower every week, capped at the first 1000 keys, and blind to whether the job behind a key finished)
+#
+# the pointer is only written after the tar is fully uploaded, by whoever finished the fine tune
+# (local_training.py in process, lambda_function_update_model.py for sagemaker jobs). an s3 PUT
+# replaces the whole object, readers see the old pointer or the new one, never half of either
+# jobs can finish (and their s3 events arrive) out of order, so a job never replaces the pointer of one
+# that started after it. the PUT is conditional on the pointer it compared against (If-Match /
+# If-None-Match), two publishers racing can't both win
+#
+# {"key": "model/fine-tune-job-1/output/model.tar.gz", "sha256": ..., "size": ..., "schema_hash": ...,
+#  "job_name": ..., "started_at": ..., "metrics": {...}, "published_at": ...}
+#
+# stdlib only, the update-model lambda imports it with nothing but boto3 installed
+#
+# old job folders are deleted by collect_old_models, keeping the newest few and whatever the pointer names
+
+pointer_filename = "latest.json"
+# written by fine_tune.py next to the model, ends up in the same model.tar.gz
+metrics_filename = "sg_t2g_model_v2.metrics.json"
+
+
+def pointer_key(prefix):
+    return f"{prefix.rstrip('/')}/{pointer_filename}".lstrip("/")
+
+
+def save_model_metrics(metrics, output_dir):
+    path = os.path.join(output_dir, metrics_filename)
+    write_json_atomic(path, metrics, indent=2, sort_keys=True)
+    return path
+
+
+def read_tar_json(tar_path, name):
+    with tarfile.open(tar_path, "r:gz") as tar:
+        try:
+            member = tar.extractfile(name)
+        except KeyError:
+            return None
+        return json.load(member) if member is not None else None
+
+
+def job_started_at(job_name):
+    # fine-tune-job-{unix seconds} / fine-tune-local-{unix seconds}, None for any other name
+    suffix = job_name.rsplit("-", 1)[-1]
+    return int(suffix) if suffix.isdigit() else None
+
+
+def build_pointer(model_key, tar_path, job_name):
+    metrics = read_tar_json(tar_path, metrics_filename) or {}
+    return {
+        "key": model_key,
+        "sha256": file_sha256(tar_path),
+        "size": os.path.getsize(tar_path),
+        # what the job trained against, None (trusted with a warning by the server) if it didn't record it
+        "schema_hash": metrics.pop("schema_hash", None),
+        "job_name": job_name,
+        "started_at": job_started_at(job_name),
+        "metrics": metrics,
+        "published_at": time.time(),
+    }
+
+
+def is_older(pointer, current):
+    # only when both start times are known, anything else is published
+    if current is None or pointer["started_at"] is None or current.get("started_at") is None:
+        return False
+    return pointer["started_at"] < current["started_at"]
+
+
+def publish_model(s3_client, bucket, prefix, model_key, tar_path, job_name, attempts=3):
+    # tar_path is the local copy of the object already uploaded at model_key
+    # returns (the pointer now in effect, whether it's this job's)
+    pointer = build_pointer(model_key, tar_path, job_name)
+    for _ in range(attempts):
+        current, etag = fetch_pointer(s3_client, bucket, prefix)
+        if current is not None and current["key"] == model_key:
+            return current, False
+        if is_older(pointer, current):
+            print(f"not publishing {model_key}, {current['key']} is from a later job")
+            return current, False
+        # https://docs.aws.amazon.com/AmazonS3/latest/userguide/conditional-writes.html
+        condition = {"IfMatch": etag} if current is not None else {"IfNoneMatch": "*"}
+        try:
+            s3_client.put_object(Bucket=bucket, Key=pointer_key(prefix), Body=json.dumps(pointer, indent=2).encode(),
+                                 ContentType="application/json", **condition)
+        except Exception as e:
+            if error_code(e) in ("PreconditionFailed", "ConditionalRequestConflict"):
+                # someone else published in between, compare against theirs
+                continue
+            raise
+        print(f"published s3://{bucket}/{pointer_key(prefix)} -> {model_key}")
+        return pointer, True
+    raise Exception(f"gave up publishing {model_key}, the pointer kept changing")
+
+
+def error_code(e):
+    # botocore ClientError code, without importing botocore
+    return getattr(e, "response", {}).get("Error", {}).get("Code")
+
+
+def fetch_pointer(s3_client, bucket, prefix):
+    # (pointer, etag), (None, None) when nothing has been published yet
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=pointer_key(prefix))
+    except Exception as e:
+        if error_code(e) in ("NoSuchKey", "404"):
+            return None, None
+        raise
+    return json.loads(response["Body"].read()), response.get("ETag")
+
+
+def read_pointer(s3_client, bucket, prefix):
+    return fetch_pointer(s3_client, bucket, prefix)[0]
+
+
+def latest_model_uri(s3_client, bucket, prefix, default_uri):
+    # the model channel for the next fine tune: the published model, so each run continues from the last
+    # one and its manifest, or default_uri (the base model) before anything is published
+    pointer = read_pointer(s3_client, bucket, prefix)
+    return f"s3://{bucket}/{pointer['key']}" if pointer else default_uri
+
+
+def list_objects(s3_client, bucket, prefix):
+    # every object under the prefix, past the 1000 keys a single list_objects_v2 call returns
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/guide/paginators.html
+    objects = []
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        objects.extend(page.get("Contents", []))
+    return objects
+
+
+def collect_old_models(s3_client, bucket, prefix, keep=10, protected_keys=(), dry_run=False):
+    # job folders ({prefix}{job_name}/...) past the newest `keep` are deleted, files at the root of the
+    # prefix (the base model, the pointer) and any folder holding a protected key are never touched
+    prefix = prefix.rstrip("/") + "/"
+    jobs = {}
+    for obj in list_objects(s3_client, bucket, prefix):
+        job_name, _, rest = obj["Key"][len(prefix):].partition("/")
+        if not rest:
+            continue
+        jobs.setdefault(job_name, []).append(obj)
+
+    protected_jobs = {key[len(prefix):].partition("/")[0] for key in protected_keys if key.startswith(prefix)}
+    newest_first = sorted(jobs, key=lambda name: max(obj["LastModified"] for obj in jobs[name]), reverse=True)
+    expired_jobs = [name for name in newest_first[keep:] if name not in protected_jobs]
+    expired_keys = [obj["Key"] for name in expired_jobs for obj in jobs[name]]
+
+    if not dry_run:
+        # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/s3/client/delete_objects.html
+        for start in range(0, len(expired_keys), 1000):
+            s3_client.delete_objects(Bucket=bucket, Delete={
+                "Objects": [{"Key": key} for key in expired_keys[start:start + 1000]], "Quiet": True})
+    print(f"{'would delete' if dry_run else 'deleted'} {len(expired_keys)} objects from "
+          f"{len(expired_jobs)} old model folders under s3://{bucket}/{prefix}")
+    return expired_keys
+
+
+if __name__ == "__main__":
+    import boto3
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bucket", default="paul-golf-model-and-data-bucket")
+    parser.add_argument("--prefix", default="model/")
+    parser.add_argument("--keep", type=int, default=10)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    s3 = boto3.client("s3")
+    pointer = read_pointer(s3, args.bucket, args.prefix)
+    print(json.dumps(pointer, indent=2) if pointer else "no model pointer published")
+    collect_old_models(s3, args.bucket, args.prefix, keep=args.keep,
+                       protected_keys=[pointer["key"]] if pointer else (), dry_run=args.dry_run)
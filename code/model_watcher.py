@@ -0,0 +1,155 @@
+import os
+import glob
+import shutil
+import tarfile
+import threading
+import time
+import numpy as np
+
+# background model reload for the flask server
+# polls for a newer model artifact (s3 model/ prefix or a local directory), loads and checks it
+# off the request path, then swaps it in with a single reference assignment
+# requests read watcher.current once, so they always see a whole model, never a half loaded one
+
+
+class ServedModel:
+    def __init__(self, model, version, loaded_at, load_seconds=0.0):
+        self.model = model
+        self.version = version
+        self.loaded_at = loaded_at
+        self.load_seconds = load_seconds
+
+
+def validate_model(model, num_features=9):
+    # score a dummy row before swapping so a broken artifact never takes traffic
+    # this also warms the model up so the first real request doesn't pay for it
+    prediction = np.asarray(model.predict(np.zeros((1, num_features))))
+    if prediction.shape != (1,) or not np.isfinite(prediction).all():
+        raise ValueError(f"model failed validation, got {prediction!r}")
+
+
+class ModelWatcher:
+    # find_latest() -> version string of the newest artifact
+    # fetch(version, dest_dir) -> path of the model file pulled into dest_dir
+    # load(path) -> model object with a predict method
+    # content_token(version) -> optional etag / hash of the version's bytes, so a version that was rejected
+    # is tried again only once its content changes, not downloaded and rejected again on every poll
+    def __init__(self, find_latest, fetch, load, work_dir, poll_seconds=300, on_swap=None, content_token=None):
+        self.find_latest = find_latest
+        self.fetch = fetch
+        self.load = load
+        self.work_dir = work_dir
+        self.poll_seconds = poll_seconds
+        self.on_swap = on_swap
+        self.content_token = content_token or (lambda version: None)
+        self.current = None
+        self.rejected = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load_version(self, version):
+        # each version gets its own folder so the file being served is never overwritten mid read
+        start = time.perf_counter()
+        dest_dir = os.path.join(self.work_dir, version_dir_name(version))
+        os.makedirs(dest_dir, exist_ok=True)
+        try:
+            model_path = self.fetch(version, dest_dir)
+        except Exception:
+            # a timeout or a dropped connection, not the artifact's fault, the next poll fetches it again
+            self._remove_failed_version(version, dest_dir)
+            raise
+        try:
+            model = self.load(model_path)
+            validate_model(model)
+        except Exception:
+            # bad content, remembered until the version's bytes change
+            self.rejected = (version, self.content_token(version))
+            self._remove_failed_version(version, dest_dir)
+            raise
+
+        previous = self.current
+        self.current = ServedModel(model, version, time.time(), time.perf_counter() - start)
+        print(f"serving model version {version}")
+        if self.on_swap:
+            self.on_swap(previous, self.current)
+        if previous is not None:
+            self._remove_old_versions(keep=(version, previous.version))
+        return self.current
+
+    def check_for_update(self):
+        latest = self.find_latest()
+        if self.current is not None and latest == self.current.version:
+            return False
+        if self.rejected == (latest, self.content_token(latest)):
+            # already failed to load, keep serving the current model until something newer shows up
+            return False
+        self.load_version(latest)
+        return True
+
+    def start(self):
+        if self.poll_seconds <= 0 or self._thread is not None:
+            return
+        # https://docs.python.org/3/library/threading.html#event-objects
+        self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.check_for_update()
+            except Exception as e:
+                # keep serving the current model, try again next poll
+                print("model reload error:", e)
+
+    def _remove_failed_version(self, version, dest_dir):
+        if self.current is None or self.current.version != version:
+            shutil.rmtree(dest_dir, ignore_errors=True)
+
+    def _remove_old_versions(self, keep):
+        keep_dirs = {version_dir_name(version) for version in keep}
+        for name in os.listdir(self.work_dir):
+            path = os.path.join(self.work_dir, name)
+            if os.path.isdir(path) and name not in keep_dirs:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def version_dir_name(version):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in version)
+
+
+def extract_model_tar(tar_path, dest_dir, model_filename):
+    # extract tar https://www.youtube.com/watch?v=k9T_7B74Kko
+    with tarfile.open(tar_path, "r:gz") as tar:
+        # filter="data" refuses absolute paths, links out of dest_dir and device files
+        # https://docs.python.org/3/library/tarfile.html#extraction-filters
+        tar.extractall(path=dest_dir, filter="data")
+    return os.path.join(dest_dir, model_filename)
+
+
+# local directory stand-in for the s3 model/ prefix
+# drop model.tar.gz files (or bare model files) into the folder and the newest one gets served
+
+def local_dir_find_latest(directory, extensions=(".tar.gz", ".pkl")):
+    candidates = []
+    for extension in extensions:
+        candidates += glob.glob(os.path.join(directory, "**", f"*{extension}"), recursive=True)
+    if not candidates:
+        raise Exception(f"no model found in {directory}")
+    latest = max(candidates, key=os.path.getmtime)
+    # include mtime so overwriting the same file name still counts as a new version
+    return f"{os.path.relpath(latest, directory)}@{int(os.path.getmtime(latest))}"
+
+
+def local_dir_fetch(directory, version, dest_dir, model_filename):
+    source_path = os.path.join(directory, version.rsplit("@", 1)[0])
+    if source_path.endswith(".tar.gz"):
+        return extract_model_tar(source_path, dest_dir, model_filename)
+    dest_path = os.path.join(dest_dir, model_filename)
+    shutil.copyfile(source_path, dest_path)
+    return dest_path
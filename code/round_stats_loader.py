@@ -0,0 +1,56 @@
+import time
+
+# bulk loader for the player_round_stats_pga_with_sg_data table
+# the old row by row cursor.execute over rounds_df.iterrows() was too slow for the micro rds instance
+# this sends chunked multi-row inserts inside one transaction per event,
+# and clears the event's rows first so a rerun replaces them instead of duplicating them
+# placeholder is "%s" for pymysql and "?" for a sqlite stand-in
+
+round_stats_cols = [
+    'tour', 'year', 'season', 'event_name', 'event_id', 'player_name', 'dg_id', 'fin_text',
+    'round_num', 'course_name', 'course_num', 'course_par', 'start_hole', 'teetime', 'round_score',
+    'sg_putt', 'sg_arg', 'sg_app', 'sg_ott', 'sg_t2g', 'sg_total', 'driving_dist', 'driving_acc',
+    'gir', 'scrambling', 'prox_rgh', 'prox_fw', 'great_shots', 'poor_shots'
+]
+
+
+def prepare_round_rows(rounds_df):
+    # missing columns and nans go in as NULL
+    df = rounds_df.reindex(columns=round_stats_cols).astype(object)
+    df = df.where(df.notna(), None)
+    return df.to_numpy().tolist()
+
+
+def load_event_rounds(connection, rounds_df, tour, event_id, year, chunk_size=1000, placeholder="%s"):
+    start = time.perf_counter()
+    # the rows are keyed by the same values the delete uses, whatever the frame had in those columns,
+    # so a rerun always replaces exactly what the last run inserted
+    rows = prepare_round_rows(rounds_df.assign(tour=tour, event_id=int(event_id), year=int(year)))
+
+    delete_rounds_query = f"""
+        DELETE FROM player_round_stats_pga_with_sg_data
+        WHERE tour = {placeholder} AND event_id = {placeholder} AND year = {placeholder}
+    """
+    insert_round_query = f"""
+        INSERT INTO player_round_stats_pga_with_sg_data ({", ".join(round_stats_cols)})
+        VALUES ({", ".join([placeholder] * len(round_stats_cols))})
+    """
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(delete_rounds_query, (tour, int(event_id), int(year)))
+        # pymysql packs each executemany into multi-row INSERT statements
+        # https://pymysql.readthedocs.io/en/latest/modules/cursors.html#pymysql.cursors.Cursor.executemany
+        for chunk_start in range(0, len(rows), chunk_size):
+            cursor.executemany(insert_round_query, rows[chunk_start:chunk_start + chunk_size])
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    seconds = time.perf_counter() - start
+    rows_per_second = len(rows) / seconds if seconds > 0 else float("inf")
+    print(f"loaded {len(rows)} rounds for event={event_id} year={year} in {seconds:.2f}s ({rows_per_second:.0f} rows/s)")
+    return len(rows)
@@ -0,0 +1,112 @@
+# production entry point for the prediction server
+# runs the flask app under gunicorn with N pre-forked worker processes instead of the
+# single threaded flask dev server, so one box uses all of its cores
+# the model is loaded once in the master (preload_app) and the workers inherit it copy-on-write
+# gc.freeze() before forking keeps the garbage collector from touching (and so copying) those pages
+#
+# SERVE_WORKERS      worker processes (default: cpu count)
+# SERVE_THREADS      threads per worker (default 1, >1 switches to the gthread worker)
+# SERVE_BIND         address to listen on (default 0.0.0.0:5000)
+# SERVE_MAX_REQUESTS recycle a worker after this many requests (default 10000, 0 turns it off)
+#
+# https://docs.gunicorn.org/en/stable/custom.html
+# https://docs.gunicorn.org/en/stable/settings.html
+
+import gc
+import os
+import sys
+import glob
+import atexit
+import shutil
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+server_module_name = "flask_server_pulls_tar_model_with_prometheus_metrics"
+
+
+def worker_models_dir(pid):
+    server_module = sys.modules[server_module_name]
+    return os.path.join(server_module.extract_dir, "models", f"worker-{pid}")
+
+
+def when_ready(server):
+    # everything loaded so far (flask, numpy, the model) is shared with the workers from here on
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # each worker polls for new models on its own and swaps them in without a restart
+    sys.modules[server_module_name].start_background_tasks(worker_models_dir(worker.pid))
+
+
+def child_exit(server, worker):
+    from serving_metrics import mark_worker_dead
+    mark_worker_dead(worker.pid)
+    shutil.rmtree(worker_models_dir(worker.pid), ignore_errors=True)
+
+
+def prepare_multiproc_dir(environ):
+    # has to run before prometheus_client is imported, so every worker writes to the shared folder
+    # without PROMETHEUS_MULTIPROC_DIR the server makes its own fresh folder (and removes it on exit);
+    # a folder that was passed in is never deleted, only its metric .db files are cleared
+    # returns (folder, whether it was created here)
+    if "PROMETHEUS_MULTIPROC_DIR" not in environ:
+        environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus_multiproc-")
+        return environ["PROMETHEUS_MULTIPROC_DIR"], True
+    multiproc_dir = environ["PROMETHEUS_MULTIPROC_DIR"]
+    # stale files from a previous run would be added into the aggregated metrics
+    # https://prometheus.github.io/client_python/multiprocess/
+    os.makedirs(multiproc_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+        os.remove(path)
+    return multiproc_dir, False
+
+
+def remove_multiproc_dir(multiproc_dir, master_pid):
+    # forked workers inherit atexit handlers, only the master removes the folder it created
+    if os.getpid() == master_pid:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+
+
+class PreforkServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # with preload_app this runs once in the master, before any worker is forked
+        import importlib
+        return importlib.import_module(server_module_name).app
+
+
+def server_options():
+    threads = int(os.environ.get("SERVE_THREADS", "1"))
+    max_requests = int(os.environ.get("SERVE_MAX_REQUESTS", "10000"))
+    return {
+        "bind": os.environ.get("SERVE_BIND", "0.0.0.0:5000"),
+        "workers": int(os.environ.get("SERVE_WORKERS", str(os.cpu_count() or 1))),
+        "threads": threads,
+        "worker_class": "gthread" if threads > 1 else "sync",
+        "preload_app": True,
+        # recycle workers gracefully, jittered so they don't all restart at once
+        "max_requests": max_requests,
+        "max_requests_jitter": max_requests // 10,
+        "graceful_timeout": 30,
+        "timeout": 30,
+        "when_ready": when_ready,
+        "post_fork": post_fork,
+        "child_exit": child_exit,
+    }
+
+
+if __name__ == "__main__":
+    multiproc_dir, created_multiproc_dir = prepare_multiproc_dir(os.environ)
+    if created_multiproc_dir:
+        atexit.register(remove_multiproc_dir, multiproc_dir, os.getpid())
+    os.environ["PREFORK_SERVER"] = "1"
+    PreforkServer(server_options()).run()
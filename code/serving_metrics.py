@@ -0,0 +1,73 @@
+import os
+import time
+from prometheus_client import (Counter, Gauge, Histogram, CollectorRegistry, generate_latest,
+                               CONTENT_TYPE_LATEST, REGISTRY)
+
+# prometheus metrics for the prediction server
+# with several worker processes, set PROMETHEUS_MULTIPROC_DIR (an empty folder) before starting;
+# every worker writes its samples there and /metrics aggregates them through MultiProcessCollector
+# https://prometheus.github.io/client_python/multiprocess/
+
+multiprocess_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# stages are fast (numpy on a handful of rows), so the buckets start well below a millisecond
+stage_buckets = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+num_predictions = Counter('predictions_counter', 'Prediction requests', ['endpoint'])
+stage_seconds = Histogram('request_stage_seconds', 'Time spent in each request stage',
+                          ['endpoint', 'stage'], buckets=stage_buckets)
+requests_in_flight = Gauge('requests_in_flight', 'Requests currently being handled',
+                           multiprocess_mode='livesum')
+request_errors = Counter('request_errors', 'Failed requests by cause', ['endpoint', 'cause'])
+model_load_seconds = Histogram('model_load_seconds', 'Time to fetch, load and validate a model',
+                               ['kind'], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+# value is the unix time the version was loaded, 0 once it's been replaced
+served_model_version = Gauge('served_model_version', 'Model version currently being served',
+                             ['version'], multiprocess_mode='mostrecent')
+
+# async server only (asgi_microbatch_server.py): how many single rows each model call coalesced,
+# and how long each row sat in the queue before its batch was scored
+microbatch_size = Histogram('microbatch_size', 'Rows per coalesced prediction call',
+                            buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+microbatch_queue_seconds = Histogram('microbatch_queue_seconds', 'Time a row waited to be batched',
+                                     buckets=stage_buckets)
+
+
+def record_microbatch(batch_size, queue_delays):
+    microbatch_size.observe(batch_size)
+    for delay in queue_delays:
+        microbatch_queue_seconds.observe(delay)
+
+
+def record_model_loaded(previous, current):
+    kind = "initial" if previous is None else "reload"
+    model_load_seconds.labels(kind=kind).observe(current.load_seconds)
+    if previous is not None and previous.version != current.version:
+        served_model_version.labels(version=previous.version).set(0)
+    served_model_version.labels(version=current.version).set(current.loaded_at)
+
+
+def timed_stream(chunks, endpoint):
+    # a streamed body is serialized after the view returns, so time it as it's consumed
+    start = time.perf_counter()
+    try:
+        for chunk in chunks:
+            yield chunk
+    finally:
+        stage_seconds.labels(endpoint=endpoint, stage="serialize").observe(time.perf_counter() - start)
+
+
+def metrics_payload():
+    if multiprocess_dir:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid):
+    # called from the process manager when a worker exits, so its live gauges stop counting
+    if multiprocess_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
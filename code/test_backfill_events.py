@@ -0,0 +1,86 @@
+import pytest
+import pandas as pd
+import backfill_events
+from backfill_events import Checkpoint, backfill, load_checkpoint, select_backfill_events
+from feature_schema import model_cols
+
+
+def make_events(event_ids):
+    return pd.DataFrame({
+        "calendar_year": 2019, "date": [f"2019-0{i % 9 + 1}-01" for i in event_ids],
+        "event_id": event_ids, "tour": "pga",
+    })
+
+
+def test_checkpoint_survives_a_torn_last_line(tmp_path):
+
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = Checkpoint(path)
+    for event_id in (1, 2):
+        checkpoint.record({"tour": "pga", "event_id": event_id, "calendar_year": 2019}, 600)
+    checkpoint.close()
+    with open(path, "a") as f:
+        f.write('{"key": "pga:3:20')
+
+    assert sorted(load_checkpoint(path)) == ["pga:1:2019", "pga:2:2019"]
+
+    # the resumed run's records go on their own line, not onto the torn one
+    checkpoint = Checkpoint(path)
+    checkpoint.record({"tour": "pga", "event_id": 3, "calendar_year": 2019}, 600)
+    checkpoint.close()
+    assert sorted(load_checkpoint(path)) == ["pga:1:2019", "pga:2:2019", "pga:3:2019"]
+
+
+def test_resume_skips_done_events_and_shards_by_event_id():
+
+    event_df = make_events([1, 2, 3, 4, 5, 6])
+    done = {"pga:2:2019": {}, "pga:3:2019": {}}
+
+    todo = select_backfill_events(event_df, done)
+    assert todo["event_id"].tolist() == [1, 4, 5, 6]
+
+    shards = [select_backfill_events(event_df, done, shard=i, num_shards=2)["event_id"].tolist() for i in range(2)]
+    assert shards == [[4, 6], [1, 5]]
+    assert select_backfill_events(event_df, done, start_date="2019-05-02")["event_id"].tolist() == [5, 6]
+
+
+class FakeDataGolfClient:
+    def __init__(self, api_key, **kwargs):
+        pass
+
+    def get_event_list(self, feed_cache=None, transform=None, variant=""):
+        return make_events([1, 2])
+
+    def get_rounds(self, tour, event_id, year):
+        return pd.DataFrame({col: [1.0, 2.0] for col in model_cols})
+
+
+class UploadFailsForEvent2:
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        if Key.startswith("data/2_"):
+            raise ConnectionError("s3 is down")
+
+
+class FakeConnection:
+    def close(self):
+        pass
+
+
+def test_event_whose_upload_failed_is_not_checkpointed(tmp_path, monkeypatch):
+    # the real ingestion module, it needs pymysql and boto3 to import
+    pytest.importorskip("pymysql")
+    pytest.importorskip("boto3")
+    import lambda_get_and_update_events as ingestion
+
+    monkeypatch.setattr(ingestion, "s3_client", UploadFailsForEvent2())
+    monkeypatch.setattr(ingestion, "connect_db", FakeConnection)
+    monkeypatch.setattr(ingestion, "make_feed_cache", lambda: None)
+    monkeypatch.setattr(backfill_events, "DataGolfClient", FakeDataGolfClient)
+    monkeypatch.setattr(backfill_events, "insert_event_rows", lambda connection, event_df: 0)
+    monkeypatch.setattr(backfill_events, "load_event_rounds", lambda connection, rounds_df, *key: len(rounds_df))
+
+    path = str(tmp_path / "checkpoint.jsonl")
+    result = backfill(path, workers=2, api_key="test-key")
+
+    assert result == {"events": 1, "rounds": 2, "failed": 1}
+    assert sorted(load_checkpoint(path)) == ["pga:1:2019"]
@@ -0,0 +1,58 @@
+import json
+import numpy as np
+import pytest
+import batch_predict_input
+from batch_predict_input import parse_batch_rows, decode_batch_rows, stream_predictions
+
+
+def test_parse_batch_rows_formats_agree():
+
+    rows = np.arange(27, dtype=np.float32).reshape(3, 9)
+
+    from_json = parse_batch_rows(json.dumps(rows.tolist()).encode(), "application/json")
+    csv_body = "sg_total,driving_dist,driving_acc,gir,scrambling,prox_rgh,prox_fw,great_shots,poor_shots\n"
+    csv_body += "\n".join(",".join(str(v) for v in row) for row in rows.tolist())
+    from_csv = parse_batch_rows(csv_body.encode(), "text/csv; charset=utf-8")
+    from_binary = parse_batch_rows(rows.astype("<f4").tobytes(), "application/octet-stream")
+
+    assert from_json.shape == (3, 9)
+    assert np.array_equal(from_json, from_csv)
+    assert np.array_equal(from_json, from_binary)
+
+
+def test_parse_batch_rows_rejects_bad_input():
+
+    with pytest.raises(ValueError):
+        parse_batch_rows(json.dumps([[1, 2, 3]]).encode(), "application/json")
+    with pytest.raises(ValueError):
+        parse_batch_rows(json.dumps([[float("nan")] * 9]).encode(), "application/json")
+    with pytest.raises(ValueError):
+        parse_batch_rows(b"\x00" * 10, "application/octet-stream")
+    # a first row starting with nan is data, not a header, so the batch is rejected rather than cut short
+    with pytest.raises(ValueError, match="nan"):
+        parse_batch_rows(("nan" + ",1" * 8 + "\n" + ",".join(["1"] * 9)).encode(), "text/csv")
+    with pytest.raises(ValueError, match="header"):
+        parse_batch_rows(b"gir,sg_total\n1,2\n", "text/csv")
+
+
+def test_row_limit_is_enforced_while_parsing(monkeypatch):
+
+    monkeypatch.setattr(batch_predict_input, "max_batch_rows", 2)
+    csv_body = "\n".join(",".join(["1"] * 9) for _ in range(5)).encode()
+    with pytest.raises(ValueError, match="too many rows"):
+        decode_batch_rows(csv_body, "text/csv")
+    with pytest.raises(ValueError, match="too many rows"):
+        decode_batch_rows(json.dumps([[1] * 9] * 3), "application/json")
+    with pytest.raises(ValueError, match="too many rows"):
+        decode_batch_rows(np.ones((3, 9), dtype="<f4").tobytes(), "application/octet-stream")
+
+
+def test_stream_predictions_is_valid_json():
+
+    predictions = np.linspace(-1, 1, 5000)
+    body = "".join(stream_predictions(predictions, "json"))
+    assert json.loads(body)["predicted sg_t2g"] == predictions.tolist()
+
+    csv_lines = "".join(stream_predictions(predictions[:3], "csv")).splitlines()
+    assert csv_lines[0] == "predicted_sg_t2g"
+    assert len(csv_lines) == 4
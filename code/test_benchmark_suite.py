@@ -0,0 +1,23 @@
+from benchmark_suite import metric, compare_to_baseline
+
+
+def test_regressions_follow_the_direction_of_each_metric():
+
+    baseline = {
+        "serving.predict.latency_p50_ms": metric(1.0, "ms", "lower"),
+        "train.rows_1000.rows_per_s": metric(1000, "rows/s", "higher"),
+        "fine_tune.rows_1000.rows_per_s": metric(1000, "rows/s", "higher"),
+    }
+    results = {
+        # 50% slower latency, 30% more throughput, 30% less throughput, and one new metric
+        "serving.predict.latency_p50_ms": metric(1.5, "ms", "lower"),
+        "train.rows_1000.rows_per_s": metric(1300, "rows/s", "higher"),
+        "fine_tune.rows_1000.rows_per_s": metric(700, "rows/s", "higher"),
+        "ingestion.events_5.seconds": metric(1.0, "s", "lower"),
+    }
+
+    comparison = compare_to_baseline(results, baseline, tolerance=0.2)
+    assert comparison["serving.predict.latency_p50_ms"]["regressed"]
+    assert not comparison["train.rows_1000.rows_per_s"]["regressed"]
+    assert comparison["fine_tune.rows_1000.rows_per_s"]["regressed"]
+    assert "ingestion.events_5.seconds" not in comparison
@@ -0,0 +1,45 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from datagolf_client import DataGolfClient, RateLimiter
+
+
+class FakeDataGolfHandler(BaseHTTPRequestHandler):
+    # fails the first rounds request with a 503 to exercise the retry path
+    calls = []
+
+    def do_GET(self):
+        FakeDataGolfHandler.calls.append(self.path)
+        if self.path.startswith("/historical-raw-data/rounds") and len(FakeDataGolfHandler.calls) == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = b"event_id,sg_t2g\n7,1.5\n"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_client_retries_against_local_server(local_http_server):
+
+    client = DataGolfClient("test-key", base_url=local_http_server(FakeDataGolfHandler),
+                            rate_limiter=RateLimiter(1000, burst=10), backoff_seconds=0.01)
+    rounds_df = client.get_rounds("pga", 7, 2025)
+
+    assert rounds_df["sg_t2g"].tolist() == [1.5]
+    assert len(FakeDataGolfHandler.calls) == 2
+    assert "key=test-key" in FakeDataGolfHandler.calls[-1]
+
+
+def test_rate_limiter_spaces_requests_across_threads():
+
+    limiter = RateLimiter(rate_per_second=50, burst=1)
+    start = time.monotonic()
+    threads = [threading.Thread(target=limiter.acquire) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # first token is free, the other 5 wait 1/50s each
+    assert time.monotonic() - start >= 0.09
@@ -0,0 +1,23 @@
+import pandas as pd
+from eventlist_db import find_new_events
+
+
+def test_find_new_events_anti_join():
+
+    event_df = pd.DataFrame({
+        "calendar_year": [2025, 2025, 2025, 2024],
+        "date": ["2025-03-02", "2025-03-09", "2025-03-16", "2024-03-16"],
+        "event_id": [7, 8, 9, 9],
+        "event_name": ["A", "B", "C", "C"],
+        "sg_categories": ["yes"] * 4,
+        "tour": ["pga"] * 4,
+        "traditional_stats": ["yes"] * 4
+    })
+    # the db hands back strings/ints of its own types, the join still has to line up
+    existing_keys_df = pd.DataFrame({"event_id": ["7", "9"], "tour": ["pga", "pga"], "calendar_year": [2025, 2025]})
+
+    new_events_df = find_new_events(event_df, existing_keys_df)
+    assert new_events_df["event_id"].tolist() == [8, 9]
+    assert new_events_df["calendar_year"].tolist() == [2025, 2024]
+
+    assert len(find_new_events(event_df, existing_keys_df.iloc[0:0])) == 4
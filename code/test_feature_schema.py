@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from feature_schema import (feature_cols, training_cols, SchemaError, to_float32_matrix, clean_matrix,
+                            validate_matrix)
+from folded_model import load_folded_model
+
+
+def make_frame(num_rows=4):
+    df = pd.DataFrame({col: np.linspace(1, 2, num_rows) for col in reversed(training_cols)})
+    df["player_name"] = "x"
+    df["great_shots"] = np.arange(num_rows)
+    return df
+
+
+def test_frames_and_arrays_become_contiguous_float32():
+
+    matrix = to_float32_matrix(make_frame())
+    assert matrix.dtype == np.float32 and matrix.flags.c_contiguous
+    assert matrix.shape == (4, len(feature_cols))
+    # by name, whatever order the frame has its columns in
+    assert matrix[:, feature_cols.index("great_shots")].tolist() == [0, 1, 2, 3]
+
+    already_float32 = np.ones((3, len(feature_cols)), dtype=np.float32)
+    assert to_float32_matrix(already_float32) is already_float32
+
+    with pytest.raises(SchemaError):
+        to_float32_matrix(make_frame().drop(columns=["gir"]))
+    with pytest.raises(SchemaError):
+        to_float32_matrix(make_frame().assign(gir="high"))
+
+
+def test_bad_rows_are_dropped_for_training_and_rejected_for_serving():
+
+    df = make_frame()
+    df.loc[1, "sg_t2g"] = np.nan
+    df.loc[2, "gir"] = -5.0
+
+    rows, num_dropped = clean_matrix(df)
+    assert num_dropped == 2
+    assert rows[:, -1].tolist() == pytest.approx([1.0, 2.0])
+
+    with pytest.raises(SchemaError, match="gir"):
+        validate_matrix(to_float32_matrix(df))
+
+
+def test_model_for_another_schema_fails_at_load(tmp_path):
+
+    coef = np.ones(len(feature_cols))
+    np.savez(tmp_path / "other.npz", coef=coef, intercept=np.array([0.5]), schema_hash=np.array("0123456789abcdef"))
+    np.savez(tmp_path / "old.npz", coef=coef, intercept=np.array([0.5]))
+
+    with pytest.raises(SchemaError):
+        load_folded_model(str(tmp_path / "other.npz"))
+    # saved before the hash existed, still loads
+    assert load_folded_model(str(tmp_path / "old.npz")).predict(np.zeros((1, len(feature_cols)))).tolist() == [0.5]
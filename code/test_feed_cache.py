@@ -0,0 +1,65 @@
+import os
+from http.server import BaseHTTPRequestHandler
+from datagolf_client import DataGolfClient, RateLimiter
+from feed_cache import FeedCache, LocalFeedStore
+
+
+class FakeEventListHandler(BaseHTTPRequestHandler):
+    # event-list feed that honors If-None-Match, send_etag=False leaves only the content hash to go on
+    body = b"event_id,tour\n7,pga\n8,euro\n"
+    send_etag = True
+    statuses = []
+
+    def do_GET(self):
+        etag = f'"{hash(FakeEventListHandler.body)}"'
+        if FakeEventListHandler.send_etag and self.headers.get("If-None-Match") == etag:
+            FakeEventListHandler.statuses.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        FakeEventListHandler.statuses.append(200)
+        self.send_response(200)
+        if FakeEventListHandler.send_etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(FakeEventListHandler.body)))
+        self.end_headers()
+        self.wfile.write(FakeEventListHandler.body)
+
+
+def fetch_events(base_url, tmp_path, send_etag):
+    FakeEventListHandler.send_etag = send_etag
+    FakeEventListHandler.statuses = []
+    FakeEventListHandler.body = b"event_id,tour\n7,pga\n8,euro\n"
+    transform_calls = []
+
+    def only_pga(df):
+        transform_calls.append(len(df))
+        return df[df["tour"] == "pga"]
+
+    client = DataGolfClient("test-key", base_url=base_url, rate_limiter=RateLimiter(1000, burst=10))
+    cache = FeedCache(LocalFeedStore(str(tmp_path)))
+    frames = [client.get_event_list(cache, only_pga) for _ in range(2)]
+    FakeEventListHandler.body = b"event_id,tour\n7,pga\n8,euro\n9,pga\n"
+    frames.append(client.get_event_list(cache, only_pga))
+    return frames, transform_calls
+
+
+def test_unchanged_feed_is_a_304_and_no_parsing(local_http_server, tmp_path):
+
+    frames, transform_calls = fetch_events(local_http_server(FakeEventListHandler), tmp_path, send_etag=True)
+
+    assert FakeEventListHandler.statuses == [200, 304, 200]
+    assert [frame["event_id"].tolist() for frame in frames] == [[7], [7], [7, 9]]
+    # parsed and filtered on the first download and when the feed changed, not on the 304
+    assert transform_calls == [2, 3]
+    # plain csv + json, nothing that gets unpickled
+    assert sorted(os.path.splitext(name)[1] for name in os.listdir(tmp_path)) == [".csv", ".json"]
+
+
+def test_content_hash_skips_parsing_without_validators(local_http_server, tmp_path):
+
+    frames, transform_calls = fetch_events(local_http_server(FakeEventListHandler), tmp_path, send_etag=False)
+
+    assert FakeEventListHandler.statuses == [200, 200, 200]
+    assert [frame["event_id"].tolist() for frame in frames] == [[7], [7], [7, 9]]
+    assert transform_calls == [2, 3]
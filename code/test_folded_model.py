@@ -0,0 +1,21 @@
+import numpy as np
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+from folded_model import export_folded_model, load_folded_model
+
+
+def test_folded_model_matches_scaler_and_model(tmp_path):
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(loc=5, scale=3, size=(200, 9))
+    y = X @ rng.normal(size=9) + 1.5
+
+    scaler = StandardScaler().fit(X)
+    model = SGDRegressor(random_state=42).fit(scaler.transform(X), y)
+
+    path = str(tmp_path / "model.npz")
+    export_folded_model(scaler, model, path)
+    folded = load_folded_model(path)
+
+    expected = model.predict(scaler.transform(X))
+    assert np.allclose(folded.predict(X), expected)
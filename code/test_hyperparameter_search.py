@@ -0,0 +1,60 @@
+import joblib
+import numpy as np
+import pandas as pd
+from feature_schema import feature_cols, model_cols, schema_hash
+from hyperparameter_search import (load_dated_rows, time_series_folds, fit_fold_scalers, make_candidates,
+                                   run_search, search_space)
+
+
+def write_event_files(data_dir, num_events=6, rows_per_event=60):
+    rng = np.random.default_rng(0)
+    weights = np.linspace(0.5, 1.5, len(feature_cols))
+    # written newest first, the rows still come back in date order
+    for week in reversed(range(num_events)):
+        X = rng.uniform(0, 10, (rows_per_event, len(feature_cols)))
+        y = np.clip(X @ weights / 10 - 4, -29, 29)
+        date = (pd.Timestamp("2025-01-05") + pd.Timedelta(weeks=week)).date()
+        pd.DataFrame(np.column_stack([y, X]), columns=model_cols).to_csv(data_dir / f"{100 + week}_{date}.csv",
+                                                                        index=False)
+
+
+def test_folds_only_validate_on_later_events(tmp_path):
+
+    write_event_files(tmp_path)
+    rows, dates = load_dated_rows(str(tmp_path))
+    assert len(rows) == 360 and (np.diff(dates) >= np.timedelta64(0)).all()
+
+    folds = time_series_folds(dates, num_folds=2)
+    assert folds == [(120, 240), (240, 360)]
+    for train_end, valid_end in folds:
+        assert dates[train_end - 1] < dates[train_end]
+    # each fold is scaled with its own training rows only, nothing from the events it's scored on
+    scalers = fit_fold_scalers(rows[:, :-1].astype(np.float64), folds)
+    assert [scaler.n_samples_seen_ for scaler in scalers] == [120, 240]
+
+
+def test_the_full_grid_is_searched():
+
+    candidates = make_candidates()
+    assert len(candidates) == np.prod([len(values) for values in search_space.values()])
+    # eta0 sets the starting step size of invscaling too
+    assert {params["eta0"] for params in candidates if params["learning_rate"] == "invscaling"} == {0.001, 0.01, 0.1}
+
+
+def test_search_writes_the_best_model_and_a_leaderboard(tmp_path):
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    write_event_files(data_dir)
+    space = {"loss": ["squared_error"], "penalty": ["l2", "l1"], "alpha": [1e-4, 10.0],
+             "learning_rate": ["invscaling"], "eta0": [0.01]}
+    assert len(make_candidates("random", num_candidates=3, space=space)) == 3
+    result = run_search(str(data_dir), str(tmp_path / "model.pkl"), num_folds=2, workers=2, space=space)
+
+    leaderboard = pd.read_csv(tmp_path / "model.leaderboard.csv")
+    assert len(leaderboard) == 4 and leaderboard["mean_rmse"].is_monotonic_increasing
+    # heavy regularisation can't fit the signal
+    assert result["best_params"]["alpha"] == 1e-4
+    saved = joblib.load(tmp_path / "model.pkl")
+    assert set(saved) == {"model", "scaler", "schema_hash"} and saved["schema_hash"] == schema_hash
+    assert (tmp_path / "model.npz").exists()
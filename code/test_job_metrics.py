@@ -0,0 +1,61 @@
+from http.server import BaseHTTPRequestHandler
+import pytest
+import fine_tune
+import job_metrics
+from job_metrics import push_job_duration
+
+pytest.importorskip("prometheus_client")
+
+
+class FakePushgatewayHandler(BaseHTTPRequestHandler):
+    pushes = []
+    status = 200
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        FakePushgatewayHandler.pushes.append((self.path, body))
+        self.send_response(FakePushgatewayHandler.status)
+        self.end_headers()
+
+
+def pushed_gauges(body):
+    return {line.split(" ")[0]: float(line.split(" ")[1]) for line in body.splitlines() if not line.startswith("#")}
+
+
+@pytest.fixture
+def pushgateway(local_http_server, monkeypatch):
+    FakePushgatewayHandler.pushes = []
+    FakePushgatewayHandler.status = 200
+    monkeypatch.setattr(job_metrics, "pushgateway_url", local_http_server(FakePushgatewayHandler))
+    return FakePushgatewayHandler
+
+
+def test_push_job_duration(pushgateway):
+
+    push_job_duration("fine_tune", 12.5, extra={"files": 3, "rows": 1800})
+
+    path, body = pushgateway.pushes[0]
+    assert path == "/metrics/job/fine_tune"
+    gauges = pushed_gauges(body)
+    assert gauges["job_duration_seconds"] == 12.5
+    assert gauges["job_succeeded"] == 1.0
+    assert gauges["job_files"] == 3.0 and gauges["job_rows"] == 1800.0
+
+
+def test_push_errors_never_fail_the_job(pushgateway):
+
+    pushgateway.status = 500
+    push_job_duration("fine_tune", 1.0)
+    assert len(pushgateway.pushes) == 1
+
+
+def test_failed_fine_tune_is_pushed(pushgateway, monkeypatch):
+
+    # no sagemaker channels, the fine tune raises before training
+    monkeypatch.delenv("SM_CHANNEL_MODEL", raising=False)
+    with pytest.raises(KeyError):
+        fine_tune.update_model()
+
+    path, body = pushgateway.pushes[0]
+    assert path == "/metrics/job/fine_tune"
+    assert pushed_gauges(body)["job_succeeded"] == 0.0
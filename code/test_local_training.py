@@ -0,0 +1,54 @@
+import io
+import json
+import os
+import tarfile
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+from feature_schema import feature_cols, model_cols, schema_hash
+from local_training import run_local_training
+from model_pointer import latest_model_uri
+
+
+def test_local_run_matches_the_sagemaker_output_contract(fake_s3, tmp_path):
+
+    rng = np.random.default_rng(0)
+    X = rng.random((200, len(feature_cols)))
+    y = X.sum(axis=1)
+    scaler = StandardScaler().fit(X)
+    model_buffer = io.BytesIO()
+    joblib.dump({"model": SGDRegressor().fit(scaler.transform(X), y), "scaler": scaler,
+                 "schema_hash": schema_hash}, model_buffer)
+
+    data = pd.DataFrame(np.column_stack([y, X]), columns=model_cols)
+    s3 = fake_s3
+    s3.put_object(Bucket="bucket", Key="data/100_2025-03-02.csv", Body=data.to_csv(index=False).encode())
+    s3.put_object(Bucket="bucket", Key="model/sg_t2g_model_v2.pkl", Body=model_buffer.getvalue())
+    s3.put_object(Bucket="bucket", Key="model/fine-tune-job-1/output/model.tar.gz", Body=b"an earlier job's output")
+
+    result = run_local_training(s3, "s3://bucket/data/100_2025-03-02.csv", "s3://bucket/model", "s3://bucket/model/",
+                                "fine-tune-local-1", hyperparameters={"workers": 1}, work_dir=str(tmp_path / "job"))
+
+    assert result["output_uri"] == "s3://bucket/model/fine-tune-local-1/output/model.tar.gz"
+    # only the files at the root of the model channel are pulled, not every earlier job's output
+    assert "model/fine-tune-job-1/output/model.tar.gz" not in s3.downloaded
+    with tarfile.open(fileobj=io.BytesIO(s3.objects["model/fine-tune-local-1/output/model.tar.gz"])) as tar:
+        assert sorted(tar.getnames()) == ["sg_t2g_model_v2.manifest.json", "sg_t2g_model_v2.metrics.json",
+                                          "sg_t2g_model_v2.npz", "sg_t2g_model_v2.pkl"]
+    # published once the upload is done, the server loads whatever this names
+    pointer = json.loads(s3.objects["model/latest.json"])
+    assert pointer["key"] == "model/fine-tune-local-1/output/model.tar.gz"
+    assert pointer["schema_hash"] == schema_hash and pointer["metrics"]["rows"] == 200
+    assert "SM_MODEL_DIR" not in os.environ
+    assert not os.path.exists(tmp_path / "job")
+
+    # the next run continues from the published model, whose manifest already lists this data file
+    model_uri = latest_model_uri(s3, "bucket", "model/", "s3://bucket/model")
+    assert model_uri == "s3://bucket/model/fine-tune-local-1/output/model.tar.gz"
+    run_local_training(s3, "s3://bucket/data/100_2025-03-02.csv", model_uri, "s3://bucket/model/",
+                       "fine-tune-local-2", hyperparameters={"workers": 1}, work_dir=str(tmp_path / "job"))
+    pointer = json.loads(s3.objects["model/latest.json"])
+    assert pointer["key"] == "model/fine-tune-local-2/output/model.tar.gz"
+    assert pointer["metrics"]["files"] == 0 and pointer["metrics"]["rows"] == 0
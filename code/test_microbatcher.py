@@ -0,0 +1,73 @@
+import asyncio
+import numpy as np
+from microbatcher import MicroBatcher
+
+
+def test_concurrent_rows_share_one_model_call():
+
+    calls = []
+
+    def predict(rows):
+        calls.append(len(rows))
+        return rows.sum(axis=1)
+
+    async def run():
+        batcher = MicroBatcher(predict, max_batch_size=64, max_wait_seconds=0.01)
+        batcher.start()
+        rows = [np.full(9, i, dtype=np.float64) for i in range(20)]
+        results = await asyncio.gather(*(batcher.predict(row) for row in rows))
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(run())
+    # every caller gets its own row's prediction back
+    assert results == [9.0 * i for i in range(20)]
+    assert calls == [20]
+
+
+def test_model_errors_reach_every_caller_in_the_batch():
+
+    def predict(rows):
+        raise RuntimeError("model failed")
+
+    async def run():
+        batcher = MicroBatcher(predict, max_wait_seconds=0.01)
+        results = await asyncio.gather(*(batcher.predict(np.zeros(9)) for _ in range(3)),
+                                       return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+
+
+def test_short_model_output_fails_the_batch_instead_of_hanging():
+
+    def predict(rows):
+        return rows.sum(axis=1)[:-1]
+
+    async def run():
+        batcher = MicroBatcher(predict, max_wait_seconds=0.01)
+        results = await asyncio.wait_for(asyncio.gather(*(batcher.predict(np.zeros(9)) for _ in range(3)),
+                                                        return_exceptions=True), timeout=5)
+        await batcher.stop()
+        return results
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(run()))
+
+
+def test_stop_fails_queued_and_in_flight_requests():
+
+    async def run():
+        # the collector sits in its wait with the first row, the next two are still queued
+        batcher = MicroBatcher(lambda rows: rows.sum(axis=1), max_batch_size=2, max_wait_seconds=60)
+        batcher.start()
+        first = asyncio.ensure_future(batcher.predict(np.zeros(9)))
+        await asyncio.sleep(0.01)
+        queued = [asyncio.ensure_future(batcher.predict(np.zeros(9))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        await batcher.stop()
+        return await asyncio.wait_for(asyncio.gather(first, *queued, return_exceptions=True), timeout=5)
+
+    results = asyncio.run(run())
+    assert len(results) == 3
+    assert all(isinstance(result, RuntimeError) and str(result) == "shutting down" for result in results)
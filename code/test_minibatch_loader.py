@@ -0,0 +1,47 @@
+import threading
+import time
+import numpy as np
+import pytest
+from minibatch_loader import iter_arrays_parallel, iter_minibatches
+
+
+def test_parallel_reads_come_back_in_file_order():
+
+    def read_file(path):
+        # later files finish first
+        time.sleep(0.01 * (5 - path))
+        return np.full((path + 1, 2), path, dtype=np.float64)
+
+    arrays = list(iter_arrays_parallel(list(range(5)), read_file, workers=3, max_queued=2))
+    assert [int(array[0, 0]) for array in arrays] == [0, 1, 2, 3, 4]
+
+
+def test_minibatches_regroup_rows_across_files():
+
+    arrays = [np.full((n, 3), i, dtype=np.float64) for i, n in enumerate([1000, 3, 7, 250, 1])]
+    batches = list(iter_minibatches(arrays, 100, np.random.default_rng(0), shuffle_buffer_batches=4))
+
+    assert sum(len(batch) for batch in batches) == 1261
+    assert all(len(batch) == 100 for batch in batches[:-1])
+    # shuffling mixes rows from different files into the same batch
+    assert any(len(np.unique(batch[:, 0])) > 1 for batch in batches)
+
+
+def test_workers_exit_when_the_reader_stops_early():
+
+    def read_file(path):
+        if path == 2:
+            raise ValueError("corrupt file")
+        return np.zeros((1, 2))
+
+    before = threading.active_count()
+    arrays = iter_arrays_parallel(list(range(50)), read_file, workers=4, max_queued=4)
+    with pytest.raises(ValueError):
+        list(arrays)
+    assert threading.active_count() == before
+
+    # the consumer closing the generator part way through stops the workers too
+    arrays = iter_arrays_parallel(list(range(50)), lambda path: np.zeros((1, 2)), workers=4, max_queued=4)
+    next(arrays)
+    arrays.close()
+    assert threading.active_count() == before
@@ -0,0 +1,34 @@
+import os
+from model_cache import ModelCache
+
+
+def write_file(path, size):
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return str(path)
+
+
+def test_model_cache_hit_integrity_and_eviction(tmp_path):
+
+    cache = ModelCache(str(tmp_path / "cache"), max_bytes=2500)
+    model_a = write_file(tmp_path / "a.pkl", 1000)
+
+    assert cache.get("model/a.tar.gz", '"etag-a"') is None
+    cache.put("model/a.tar.gz", '"etag-a"', [model_a])
+    cache.mark_good("model/a.tar.gz", '"etag-a"')
+    assert cache.get("model/a.tar.gz", '"etag-a"') is not None
+    # same key with a new etag is a different artifact
+    assert cache.get("model/a.tar.gz", '"etag-b"') is None
+
+    # a corrupted file is dropped instead of loaded
+    cache.put("model/b.tar.gz", '"etag-b"', [write_file(tmp_path / "b.pkl", 1000)])
+    entry_b = cache.get("model/b.tar.gz", '"etag-b"')
+    write_file(os.path.join(entry_b, "b.pkl"), 1000)
+    assert cache.get("model/b.tar.gz", '"etag-b"') is None
+
+    # going over max_bytes evicts the oldest entries but never the last good one
+    cache.put("model/c.tar.gz", '"etag-c"', [write_file(tmp_path / "c.pkl", 1000)])
+    cache.put("model/d.tar.gz", '"etag-d"', [write_file(tmp_path / "d.pkl", 1000)])
+    assert cache.get("model/c.tar.gz", '"etag-c"') is None
+    assert cache.get("model/d.tar.gz", '"etag-d"') is not None
+    assert cache.last_good()["key"] == "model/a.tar.gz"
@@ -0,0 +1,48 @@
+import io
+import json
+import tarfile
+from feature_schema import schema_hash
+from model_pointer import publish_model, read_pointer, collect_old_models, metrics_filename
+
+
+def test_publish_then_read_the_pointer(fake_s3, tmp_path):
+
+    s3 = fake_s3
+    assert read_pointer(s3, "bucket", "model/") is None
+
+    metrics = json.dumps({"schema_hash": schema_hash, "rows": 12}).encode()
+    tar_path = str(tmp_path / "model.tar.gz")
+    with tarfile.open(tar_path, "w:gz") as tar:
+        info = tarfile.TarInfo(metrics_filename)
+        info.size = len(metrics)
+        tar.addfile(info, io.BytesIO(metrics))
+
+    _, published = publish_model(s3, "bucket", "model/", "model/job-200/output/model.tar.gz", tar_path, "job-200")
+    assert published
+    pointer = read_pointer(s3, "bucket", "model/")
+    assert pointer["key"] == "model/job-200/output/model.tar.gz"
+    assert pointer["schema_hash"] == schema_hash and pointer["metrics"] == {"rows": 12}
+    assert len(pointer["sha256"]) == 64
+
+    # an older job whose s3 event arrives late never rolls the pointer back
+    current, published = publish_model(s3, "bucket", "model/", "model/job-100/output/model.tar.gz", tar_path,
+                                       "job-100")
+    assert not published and current["key"] == "model/job-200/output/model.tar.gz"
+    assert publish_model(s3, "bucket", "model/", "model/job-300/output/model.tar.gz", tar_path, "job-300")[1]
+
+
+def test_old_job_folders_are_collected_but_not_the_published_one(fake_s3):
+
+    s3 = fake_s3
+    s3.put_object(Bucket="bucket", Key="model/sg_t2g_model_v2.pkl", Body=b"base")
+    s3.put_object(Bucket="bucket", Key="model/latest.json", Body=b"{}")
+    # written oldest job first, job-4 is the newest
+    for week in range(5):
+        s3.put_object(Bucket="bucket", Key=f"model/job-{week}/output/model.tar.gz", Body=b"tar")
+        s3.put_object(Bucket="bucket", Key=f"model/job-{week}/debug-output/log.txt", Body=b"log")
+
+    deleted = collect_old_models(s3, "bucket", "model/", keep=2, protected_keys=["model/job-0/output/model.tar.gz"])
+
+    assert len(deleted) == 4
+    assert sorted({key.split("/")[1] for key in s3.objects}) == [
+        "job-0", "job-3", "job-4", "latest.json", "sg_t2g_model_v2.pkl"]
@@ -0,0 +1,61 @@
+import os
+import numpy as np
+import pytest
+from model_watcher import ModelWatcher
+
+
+class ConstantModel:
+    def __init__(self, value):
+        self.value = value
+
+    def predict(self, X):
+        return np.full(len(X), self.value)
+
+
+def test_watcher_swaps_only_valid_newer_models(tmp_path):
+
+    versions = {"v1": 1.0}
+    latest = ["v1"]
+
+    fetched = []
+    fetch_errors = []
+
+    def fetch(version, dest_dir):
+        fetched.append(version)
+        if fetch_errors:
+            raise fetch_errors.pop()
+        path = os.path.join(dest_dir, "model.txt")
+        with open(path, "w") as f:
+            f.write(version)
+        return path
+
+    def load(path):
+        with open(path) as f:
+            return ConstantModel(versions[f.read()])
+
+    watcher = ModelWatcher(lambda: latest[0], fetch, load, work_dir=str(tmp_path), poll_seconds=0)
+    watcher.load_version("v1")
+    assert watcher.check_for_update() is False
+
+    # a fetch that times out once isn't held against v2, the next poll loads it
+    versions["v2"] = 2.0
+    latest[0] = "v2"
+    fetch_errors.append(ConnectionError("read timed out"))
+    with pytest.raises(ConnectionError):
+        watcher.check_for_update()
+    assert watcher.current.version == "v1"
+    assert watcher.check_for_update() is True
+    assert watcher.current.version == "v2"
+    assert watcher.current.model.predict(np.zeros((1, 9)))[0] == 2.0
+
+    # a model that predicts nan is rejected and v2 keeps serving
+    versions["v3"] = float("nan")
+    latest[0] = "v3"
+    with pytest.raises(ValueError):
+        watcher.check_for_update()
+    assert watcher.current.version == "v2"
+    # and isn't fetched again on the next poll, nor left on disk
+    fetches = len(fetched)
+    assert watcher.check_for_update() is False
+    assert len(fetched) == fetches
+    assert sorted(os.listdir(tmp_path)) == ["v1", "v2"]
@@ -0,0 +1,44 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from round_stats_loader import load_event_rounds, round_stats_cols
+
+
+def test_load_event_rounds_is_idempotent_on_sqlite():
+
+    connection = sqlite3.connect(":memory:")
+    connection.execute(f"CREATE TABLE player_round_stats_pga_with_sg_data ({', '.join(round_stats_cols)})")
+
+    rounds_df = pd.DataFrame({
+        "tour": ["pga"] * 5,
+        "year": [2025] * 5,
+        "event_id": [7] * 5,
+        "player_name": ["a", "b", "c", "d", "e"],
+        "sg_t2g": [1.0, np.nan, 0.5, -1.2, 2.0],
+    })
+
+    assert load_event_rounds(connection, rounds_df, "pga", 7, 2025, chunk_size=2, placeholder="?") == 5
+    # second run replaces the event's rows instead of adding to them
+    load_event_rounds(connection, rounds_df, "pga", 7, 2025, chunk_size=2, placeholder="?")
+
+    rows = connection.execute(
+        "SELECT player_name, sg_t2g, course_name FROM player_round_stats_pga_with_sg_data ORDER BY player_name"
+    ).fetchall()
+    assert len(rows) == 5
+    assert rows[1] == ("b", None, None)
+
+
+def test_rows_are_keyed_by_the_event_arguments():
+
+    connection = sqlite3.connect(":memory:")
+    connection.execute(f"CREATE TABLE player_round_stats_pga_with_sg_data ({', '.join(round_stats_cols)})")
+
+    # no key columns at all, then a different year in the frame than the one being loaded
+    rounds_df = pd.DataFrame({"player_name": ["a", "b"], "sg_t2g": [1.0, 2.0]})
+    load_event_rounds(connection, rounds_df, "pga", 7, 2025, placeholder="?")
+    load_event_rounds(connection, rounds_df.assign(tour="PGA", event_id=7, year=2024), "pga", 7, 2025,
+                      placeholder="?")
+
+    rows = connection.execute("SELECT DISTINCT tour, event_id, year FROM player_round_stats_pga_with_sg_data").fetchall()
+    assert rows == [("pga", 7, 2025)]
+    assert connection.execute("SELECT COUNT(*) FROM player_round_stats_pga_with_sg_data").fetchone() == (2,)
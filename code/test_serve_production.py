@@ -0,0 +1,62 @@
+import os
+import sys
+import types
+import pytest
+
+pytest.importorskip("gunicorn")
+pytest.importorskip("prometheus_client")
+
+import serve_production
+from serve_production import prepare_multiproc_dir, remove_multiproc_dir, post_fork, child_exit
+
+
+def test_multiproc_dir_is_created_when_unset_and_removed_by_the_master_only(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(serve_production.tempfile, "tempdir", str(tmp_path))
+    environ = {}
+    multiproc_dir, created = prepare_multiproc_dir(environ)
+
+    assert created and environ["PROMETHEUS_MULTIPROC_DIR"] == multiproc_dir
+    assert os.path.dirname(multiproc_dir) == str(tmp_path) and os.listdir(multiproc_dir) == []
+    # a forked worker running the inherited atexit handler leaves it alone
+    remove_multiproc_dir(multiproc_dir, os.getpid() + 1)
+    assert os.path.isdir(multiproc_dir)
+    remove_multiproc_dir(multiproc_dir, os.getpid())
+    assert not os.path.exists(multiproc_dir)
+
+
+def test_multiproc_dir_that_was_passed_in_only_loses_its_db_files(tmp_path):
+
+    multiproc_dir = tmp_path / "metrics"
+    multiproc_dir.mkdir()
+    for name in ("counter_1.db", "gauge_livesum_2.db", "notes.txt"):
+        (multiproc_dir / name).write_text("")
+
+    assert prepare_multiproc_dir({"PROMETHEUS_MULTIPROC_DIR": str(multiproc_dir)}) == (str(multiproc_dir), False)
+    assert os.listdir(multiproc_dir) == ["notes.txt"]
+
+    # a folder that doesn't exist yet is made
+    missing_dir = tmp_path / "missing"
+    prepare_multiproc_dir({"PROMETHEUS_MULTIPROC_DIR": str(missing_dir)})
+    assert missing_dir.is_dir()
+
+
+def test_each_worker_gets_its_own_models_folder_removed_when_it_exits(tmp_path, monkeypatch):
+
+    # stands in for the flask server module, which loads a model from s3 when it's imported
+    started = []
+
+    def start_background_tasks(work_dir):
+        started.append(work_dir)
+        os.makedirs(work_dir)
+
+    server_module = types.SimpleNamespace(extract_dir=str(tmp_path), start_background_tasks=start_background_tasks)
+    monkeypatch.setitem(sys.modules, serve_production.server_module_name, server_module)
+    workers = [types.SimpleNamespace(pid=pid) for pid in (101, 102)]
+
+    for worker in workers:
+        post_fork(None, worker)
+    assert started == [str(tmp_path / "models" / "worker-101"), str(tmp_path / "models" / "worker-102")]
+
+    child_exit(None, workers[0])
+    assert os.listdir(tmp_path / "models") == ["worker-102"]
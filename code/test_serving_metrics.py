@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+code_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_process(multiproc_dir, script, *args):
+    # a fresh interpreter per worker, prometheus_client picks multiprocess mode when it's imported
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(multiproc_dir)}
+    return subprocess.run([sys.executable, "-c", script, *args], cwd=code_dir, env=env, check=True,
+                          capture_output=True, text=True).stdout
+
+
+def sample(payload, line_start):
+    return float(next(line for line in payload.splitlines() if line.startswith(line_start)).rsplit(" ", 1)[1])
+
+
+def test_metrics_from_every_worker_are_aggregated(tmp_path):
+
+    worker = """
+import os, sys
+from serving_metrics import num_predictions, requests_in_flight
+num_predictions.labels(endpoint="/predict").inc(int(sys.argv[1]))
+requests_in_flight.inc()
+print(os.getpid())
+"""
+    first_pid = run_process(tmp_path, worker, "3").strip()
+    run_process(tmp_path, worker, "2")
+
+    scrape = """
+import sys
+from serving_metrics import metrics_payload, mark_worker_dead
+print(metrics_payload()[0].decode())
+print("---")
+mark_worker_dead(int(sys.argv[1]))
+print(metrics_payload()[0].decode())
+"""
+    before, after = run_process(tmp_path, scrape, first_pid).split("---")
+
+    assert sample(before, 'predictions_counter_total{endpoint="/predict"}') == 5.0
+    assert sample(before, "requests_in_flight ") == 2.0
+    # a dead worker's requests no longer count as in flight, its counters still do
+    assert sample(after, "requests_in_flight ") == 1.0
+    assert sample(after, 'predictions_counter_total{endpoint="/predict"}') == 5.0
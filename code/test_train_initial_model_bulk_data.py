@@ -0,0 +1,31 @@
+import joblib
+import numpy as np
+import pandas as pd
+from feature_schema import feature_cols, model_cols
+from training_data_io import iter_training_chunks
+from train_initial_model_bulk_data import train_and_save_model_streaming
+
+
+def test_streaming_trainer_reads_every_chunk_and_fits(tmp_path):
+
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 10, (2500, len(feature_cols)))
+    y = X @ np.linspace(0.5, 1.5, len(feature_cols)) / 10 - 4
+    df = pd.DataFrame(np.column_stack([y, X]), columns=model_cols)
+    # a row the trainer has to drop
+    df.loc[3, "gir"] = np.nan
+    data_path = str(tmp_path / "rounds.csv")
+    df.to_csv(data_path, index=False)
+
+    chunks = list(iter_training_chunks(data_path, chunk_size=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    assert list(chunks[0].columns) == model_cols and (chunks[0].dtypes == np.float32).all()
+
+    model_path = str(tmp_path / "model.pkl")
+    train_and_save_model_streaming(data_path, model_path, chunk_size=1000, epochs=3)
+
+    saved = joblib.load(model_path)
+    assert saved["scaler"].n_samples_seen_ == 2499
+    predictions = saved["model"].predict(saved["scaler"].transform(X[:100]))
+    assert np.sqrt(np.mean((predictions - y[:100]) ** 2)) < 0.1
+    assert (tmp_path / "model.npz").exists()
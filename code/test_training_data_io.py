@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+from training_data_io import model_cols, read_training_file, serialize_training_frame, training_data_key
+
+
+def test_parquet_and_csv_read_back_the_same_model_columns(tmp_path):
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(20, len(model_cols))), columns=model_cols)
+    df["player_name"] = "x"
+
+    assert training_data_key(7, "2025-03-02", 2025, "parquet") == "data/season=2025/7_2025-03-02.parquet"
+
+    csv_path = tmp_path / "7_2025-03-02.csv"
+    csv_path.write_text(serialize_training_frame(df, "csv"))
+    parquet_path = tmp_path / "7_2025-03-02.parquet"
+    parquet_path.write_bytes(serialize_training_frame(df, "parquet"))
+
+    from_csv = read_training_file(str(csv_path))
+    from_parquet = read_training_file(str(parquet_path))
+
+    assert list(from_parquet.columns) == model_cols
+    assert (from_parquet.dtypes == np.float32).all()
+    assert (from_csv.dtypes == np.float32).all()
+    assert np.allclose(from_csv.to_numpy(), from_parquet.to_numpy())
@@ -0,0 +1,29 @@
+import os
+from training_manifest import (load_manifest, save_manifest, select_unseen_files, select_event_range,
+                               record_consumed_files)
+
+
+def test_manifest_selects_only_unseen_files(tmp_path):
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    paths = []
+    for event_id in (7, 8, 9):
+        path = data_dir / f"{event_id}_2025-03-0{event_id - 6}.csv"
+        path.write_text(f"sg_t2g\n{event_id}\n")
+        paths.append(str(path))
+
+    manifest = load_manifest(str(tmp_path))
+    assert select_unseen_files(paths, str(data_dir), manifest) == paths
+
+    record_consumed_files(manifest, str(data_dir), paths[:2], [1, 1])
+    save_manifest(manifest, str(tmp_path))
+    manifest = load_manifest(str(tmp_path))
+    assert select_unseen_files(paths, str(data_dir), manifest) == paths[2:]
+
+    # same bytes under a new name were already trained on
+    renamed = data_dir / "7_copy.csv"
+    renamed.write_text("sg_t2g\n7\n")
+    assert select_unseen_files([str(renamed)], str(data_dir), manifest) == []
+
+    assert select_event_range(paths, 8, 9) == paths[1:]
@@ -1,19 +1,26 @@
+import os
+import sys
+import time
+import argparse
 import pandas as pd
 import numpy as np
 import joblib
 from sklearn.linear_model import SGDRegressor
 from sklearn.preprocessing import StandardScaler
+from folded_model import export_folded_model
+from feature_schema import schema_hash, clean_matrix
+from training_data_io import read_training_file, iter_training_chunks
 
 def train_and_save_model(csv_path, model_path):
 
-    df = pd.read_csv(csv_path)
-    df.dropna(inplace=True)
+    # csv or parquet, only the model columns as float32
+    # rows with nulls or impossible values dropped, features first then the label (feature_schema.py)
+    data, num_dropped = clean_matrix(read_training_file(csv_path))
+    print(f"{len(data)} training rows, {num_dropped} dropped")
 
-    feature_cols = ['sg_total', 'driving_dist', 'driving_acc', 'gir', 'scrambling',
-                    'prox_rgh', 'prox_fw', 'great_shots', 'poor_shots']
-    target_col = 'sg_t2g'
-    X = df[feature_cols]
-    y = df[target_col]
+    # SGDRegressor keeps its weights in float64
+    X = data[:, :-1].astype(np.float64)
+    y = data[:, -1].astype(np.float64)
 
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
@@ -21,10 +28,85 @@ def train_and_save_model(csv_path, model_path):
     model = SGDRegressor(loss="squared_error", max_iter=1000, tol=1e-3, random_state=42)
     model.fit(X_scaled, y)
 
-    joblib.dump({'scaler': scaler, 'model': model}, model_path)
+    save_model(scaler, model, model_path)
+
+
+def save_model(scaler, model, model_path):
+    # schema_hash is checked whenever the model is loaded
+    joblib.dump({'scaler': scaler, 'model': model, 'schema_hash': schema_hash}, model_path)
     print(f"Model saved to {model_path}")
 
+    # numpy only copy of the model for the server, scaler folded into the coefficients
+    folded_path = os.path.splitext(model_path)[0] + ".npz"
+    export_folded_model(scaler, model, folded_path)
+    print(f"Folded model saved to {folded_path}")
+
+
+def peak_memory_mb():
+    # ru_maxrss is kilobytes on linux, bytes on mac; resource is unix only, nan on windows
+    # https://docs.python.org/3/library/resource.html#resource.getrusage
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# out of core version of train_and_save_model
+# pass 1 fits the scaler with partial_fit, then each epoch streams the file again and
+# runs SGDRegressor.partial_fit on every chunk, shuffled within the chunk
+# only one chunk is in memory at a time, so peak memory depends on chunk_size, not on the file size
+def train_and_save_model_streaming(data_path, model_path, chunk_size=100000, epochs=5, random_state=42):
+    rng = np.random.default_rng(random_state)
+
+    start = time.perf_counter()
+    scaler = StandardScaler()
+    num_rows = 0
+    for chunk in iter_training_chunks(data_path, chunk_size):
+        data, _ = clean_matrix(chunk)
+        if not len(data):
+            continue
+        # https://scikit-learn.org/stable/modules/generated/sklearn.preprocessing.StandardScaler.html#sklearn.preprocessing.StandardScaler.partial_fit
+        scaler.partial_fit(data[:, :-1].astype(np.float64))
+        num_rows += len(data)
+    seconds = time.perf_counter() - start
+    print(f"scaler pass: {num_rows} rows in {seconds:.1f}s ({num_rows / max(seconds, 1e-9):.0f} rows/s), "
+          f"peak memory {peak_memory_mb():.0f} MB")
+
+    model = SGDRegressor(loss="squared_error", random_state=random_state)
+    for epoch in range(epochs):
+        start = time.perf_counter()
+        for chunk in iter_training_chunks(data_path, chunk_size):
+            data, _ = clean_matrix(chunk)
+            if not len(data):
+                continue
+            order = rng.permutation(len(data))
+            X = data[order, :-1].astype(np.float64)
+            y = data[order, -1].astype(np.float64)
+            # https://scikit-learn.org/stable/modules/generated/sklearn.linear_model.SGDRegressor.html#sklearn.linear_model.SGDRegressor.partial_fit
+            model.partial_fit(scaler.transform(X), y)
+        seconds = time.perf_counter() - start
+        print(f"epoch {epoch + 1}/{epochs}: {num_rows} rows in {seconds:.1f}s "
+              f"({num_rows / max(seconds, 1e-9):.0f} rows/s), peak memory {peak_memory_mb():.0f} MB")
+
+    save_model(scaler, model, model_path)
+
+
 if __name__ == "__main__":
     csv_file = "/Users/paul/Documents/School/a. Northwestern_MSIS/f. Quarter 6/MSDS434 Cloud Computing/z_Final Project/data/simple_golf_stats_db only pga with sg cat/player_round_data_pga_tour_with_sg_data.csv"
     model_file = "/Users/paul/Documents/School/a. Northwestern_MSIS/f. Quarter 6/MSDS434 Cloud Computing/z_Final Project/model/sg_t2g_model_v2.pkl"
-    train_and_save_model(csv_file, model_file)
+
+    # --stream trains chunk by chunk for data that doesn't fit in memory
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=csv_file)
+    parser.add_argument("--model", default=model_file)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--epochs", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.stream:
+        train_and_save_model_streaming(args.data, args.model, chunk_size=args.chunk_size, epochs=args.epochs)
+    else:
+        train_and_save_model(args.data, args.model)
@@ -0,0 +1,62 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+from feature_schema import model_cols
+from training_file_types import training_file_extensions, training_file_content_type
+
+# training data files written by ingestion and read by fine_tune.py / train_initial_model_bulk_data.py
+# csv is the original layout: data/{event_id}_{date}.csv
+# parquet is the columnar layout: data/season={season}/{event_id}_{date}.parquet, float32 model columns only
+# readers only ever pull the 10 model columns, as float32, whichever format the file is in
+# parquet needs pyarrow installed https://pandas.pydata.org/docs/reference/api/pandas.read_parquet.html
+
+
+def training_data_key(event_id, date, season, data_format="csv"):
+    if data_format == "parquet":
+        # hive style partition folder so a full retrain can pick seasons without listing everything
+        return f"data/season={season}/{event_id}_{date}.parquet"
+    return f"data/{event_id}_{date}.csv"
+
+
+def serialize_training_frame(df, data_format="csv"):
+    df = df[model_cols]
+    if data_format == "parquet":
+        buffer = io.BytesIO()
+        df.astype(np.float32).to_parquet(buffer, index=False, compression="zstd")
+        return buffer.getvalue()
+    csv_buffer = io.StringIO()
+    df.to_csv(csv_buffer, index=False)
+    return csv_buffer.getvalue()
+
+
+def read_training_file(path, columns=model_cols):
+    # projection: only the columns the model needs are parsed, straight into float32
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns).astype(np.float32)
+    return pd.read_csv(path, usecols=columns, dtype={col: np.float32 for col in columns})[columns]
+
+
+def list_training_files(data_dir):
+    # walks partition folders too, sorted so runs are repeatable
+    training_files = []
+    for root, _, files in os.walk(data_dir):
+        for file in files:
+            if file.endswith(training_file_extensions):
+                training_files.append(os.path.join(root, file))
+    return sorted(training_files)
+
+
+def iter_training_chunks(path, chunk_size, columns=model_cols):
+    # bounded size float32 chunks so a full history file never has to fit in memory at once
+    if path.endswith(".parquet"):
+        # https://arrow.apache.org/docs/python/generated/pyarrow.parquet.ParquetFile.html
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas().astype(np.float32)
+        return
+    # https://pandas.pydata.org/docs/user_guide/io.html#iterating-through-files-chunk-by-chunk
+    with pd.read_csv(path, usecols=columns, dtype={col: np.float32 for col in columns},
+                     chunksize=chunk_size) as reader:
+        for chunk in reader:
+            yield chunk[columns]
@@ -0,0 +1,10 @@
+# training data file types, kept free of pandas / numpy so the update-model lambda can import it with
+# nothing but boto3 installed (training_data_io.py reads and writes the files themselves)
+
+training_file_extensions = (".csv", ".parquet")
+
+
+def training_file_content_type(path):
+    if path.endswith(".parquet"):
+        return "application/x-parquet"
+    return "text/csv"
@@ -0,0 +1,71 @@
+import os
+import json
+import time
+from model_cache import file_sha256, write_json_atomic
+
+# watermark manifest of the data files a model has already been trained on
+# lives next to the model artifact (read from the model channel, written to SM_MODEL_DIR)
+# each run trains on exactly the files not in the manifest, instead of guessing with file mtimes
+# files whose name and size match an entry are skipped without being read, so a run costs O(new files)
+
+manifest_filename = "sg_t2g_model_v2.manifest.json"
+
+
+def load_manifest(model_dir):
+    path = os.path.join(model_dir, manifest_filename)
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, output_dir):
+    path = os.path.join(output_dir, manifest_filename)
+    write_json_atomic(path, manifest, indent=2, sort_keys=True)
+    return path
+
+
+def event_id_from_path(path):
+    # data files are named {event_id}_{date}.csv / .parquet
+    try:
+        return int(os.path.basename(path).split("_", 1)[0])
+    except ValueError:
+        return None
+
+
+def select_unseen_files(training_files, data_dir, manifest):
+    entries = manifest["files"]
+    seen_hashes = {entry["sha256"] for entry in entries.values()}
+    unseen = []
+    for path in training_files:
+        name = os.path.relpath(path, data_dir)
+        entry = entries.get(name)
+        if entry is not None and entry["size"] == os.path.getsize(path):
+            continue
+        # new name or changed size, the hash decides (a renamed copy of old data is still skipped)
+        if file_sha256(path) in seen_hashes:
+            continue
+        unseen.append(path)
+    return unseen
+
+
+def select_event_range(training_files, first_event_id, last_event_id):
+    # deterministic rerun of a range of events, ignores what the manifest says was consumed
+    selected = []
+    for path in training_files:
+        event_id = event_id_from_path(path)
+        if event_id is not None and first_event_id <= event_id <= last_event_id:
+            selected.append(path)
+    return selected
+
+
+def record_consumed_files(manifest, data_dir, file_paths, row_counts):
+    now = time.time()
+    for path, rows in zip(file_paths, row_counts):
+        manifest["files"][os.path.relpath(path, data_dir)] = {
+            "sha256": file_sha256(path),
+            "size": os.path.getsize(path),
+            "rows": int(rows),
+            "consumed_at": now,
+        }
+    return manifest